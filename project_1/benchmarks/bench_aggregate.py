@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import cleaning_utils.clean as c
+
+# number of listings in the Boston and Seattle Inside Airbnb snapshots
+CITIES = {'Boston': 3585, 'Seattle': 3818}
+
+
+def make_aggregated_dataframe_merge(df, list_of_funcs, names_of_funcs):
+    '''the original make_aggregated_dataframe: a groupby and merge per function
+    '''
+    calendar_no_nas = df.dropna(subset=['price']).drop(columns=['available']).copy(deep=True)
+    aggregated_dataframe = pd.DataFrame(data=calendar_no_nas['listing_id'].unique(), columns=['listing_id'])
+    for func, name in zip(list_of_funcs, names_of_funcs):
+        aggregated_dataframe = aggregated_dataframe.merge(calendar_no_nas.groupby('listing_id').agg(func)['price'].reset_index(name=name), on='listing_id')
+    return aggregated_dataframe
+
+
+def make_calendar(n_listings, seed):
+    '''make a cleaned calendar with a year of daily rows per listing, like calendar.csv
+    '''
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2016-09-06', periods=365)
+    listing_ids = rng.choice(10**8, size=n_listings, replace=False)
+    available = rng.random(n_listings * 365) < .5
+    base_price = np.repeat(rng.integers(40, 500, size=n_listings), 365)
+    price = np.where(available, base_price * rng.uniform(.8, 1.5, size=len(available)), np.nan)
+    return pd.DataFrame({'listing_id': np.repeat(listing_ids, 365).astype('object'),
+                         'date': np.tile(dates, n_listings),
+                         'available': available,
+                         'price': price.round()})
+
+
+def time_call(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    '''time the Boston + Seattle calendar aggregation of data_cleaning.ipynb
+    '''
+    # pandas < 3 ran np.mean, np.std and np.median as these groupby methods
+    list_of_funcs = ['mean', 'std', 'median']
+    names_of_funcs = ['mean_price', 'stand_dev_price', 'median_price']
+
+    print('{:<10} {:>10} {:>12} {:>12} {:>12}'
+          .format('city', 'rows', 'merge (s)', 'groupby (s)', 'sorted (s)'))
+    for seed, (city, n_listings) in enumerate(CITIES.items()):
+        calendar = make_calendar(n_listings, seed)
+        expected, merge_time = time_call(make_aggregated_dataframe_merge, calendar,
+                                         list_of_funcs, names_of_funcs)
+        grouped, groupby_time = time_call(c.make_aggregated_dataframe, calendar,
+                                          [np.mean, np.std, np.median], names_of_funcs)
+        fast, sorted_time = time_call(c.make_aggregated_dataframe, calendar,
+                                      [np.mean, np.std, np.median], names_of_funcs, is_sorted=True)
+        pd.testing.assert_frame_equal(grouped, expected)
+        pd.testing.assert_frame_equal(fast, expected)
+        print('{:<10} {:>10,} {:>12.3f} {:>12.3f} {:>12.3f}'
+              .format(city, len(calendar), merge_time, groupby_time, sorted_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+import os
+import sys
+import copy
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import cleaning_utils.clean as c
+import cleaning_utils.parsers as p
+
+# number of listings in the Boston and Seattle Inside Airbnb snapshots
+CITIES = {'Boston': 3585, 'Seattle': 3818}
+AMENITIES = ['TV', 'Cable TV', 'Internet', 'Wireless Internet', 'Air Conditioning', 'Kitchen',
+             'Heating', 'Washer', 'Dryer', 'Smoke Detector', 'Carbon Monoxide Detector',
+             'Essentials', 'Shampoo', 'Family/Kid Friendly', 'Free Parking on Premises',
+             'translation missing: en.hosting_amenity_49', 'Laptop Friendly Workspace']
+VERIFICATIONS = ['email', 'phone', 'reviews', 'kba', 'facebook', 'jumio', 'linkedin']
+FEATURES = {
+    'features_to_drop': ['listing_url', 'scrape_id'],
+    'features_w_nas_to_drop': ['license'],
+    'missing_features': ['license'],
+    'rate_features': ['host_response_rate', 'host_acceptance_rate'],
+    'features_to_fix': ['host_is_superhost', 'host_has_profile_pic', 'host_identity_verified',
+                        'requires_license', 'instant_bookable', 'require_guest_profile_picture',
+                        'require_guest_phone_verification'],
+    'features_w_dollar_signs': ['price', 'security_deposit', 'cleaning_fee', 'extra_people'],
+    'empty_features': ['square_feet'],
+    'mapper': {'today': '0', 'yesterday': '1', '2 days ago': '2', '3 days ago': '3',
+               '4 days ago': '4', '5 days ago': '5', '6 days ago': '6', 'a week ago': '7',
+               '1 week ago': '7', '2 weeks ago': '14'},
+    'reviews_levels': [2., 4., 5., 6., 7., 8., 9., 10.]
+}
+
+
+def make_listings(n_listings, seed):
+    '''make a raw listings.csv like frame with the columns clean_airbnb_listings touches
+    '''
+    rng = np.random.default_rng(seed)
+
+    def maybe_missing(values, rate=.1):
+        values = pd.Series(values, dtype='object')
+        return values.mask(rng.random(n_listings) < rate)
+
+    def text_lists(items, template, quote):
+        return ['{}{}{}'.format(template[0], ','.join(quote + item + quote if ' ' in item else item
+                                                      for item in rng.choice(items, rng.integers(0, len(items)),
+                                                                             replace=False)),
+                                template[1]) for _ in range(n_listings)]
+
+    prices = rng.integers(20, 3000, size=(n_listings, 4))
+    listings = pd.DataFrame({
+        'id': rng.choice(10**8, size=n_listings, replace=False),
+        'listing_url': 'https://www.airbnb.com/rooms/1',
+        'scrape_id': 20160906204935,
+        'host_response_rate': maybe_missing(['{}%'.format(rate) for rate in rng.integers(0, 101, n_listings)]),
+        'host_acceptance_rate': maybe_missing(['{}%'.format(rate) for rate in rng.integers(0, 101, n_listings)]),
+        'host_verifications': ["['" + "', '".join(rng.choice(VERIFICATIONS, rng.integers(1, 5), replace=False)) + "']"
+                               for _ in range(n_listings)],
+        'amenities': text_lists(AMENITIES, '{}', '"'),
+        'zipcode': maybe_missing(rng.choice(['02134', '02134-1704', '98122', '98122 2108'], n_listings)),
+        'square_feet': np.nan,
+        'calendar_updated': rng.choice(list(FEATURES['mapper']) + ['3 weeks ago', '2 months ago', 'never'],
+                                       n_listings),
+        'host_response_time': maybe_missing(rng.choice(['within an hour', 'within a few hours', 'within a day',
+                                                        'a few days or more'], n_listings)),
+        'review_scores_value': pd.Series(rng.integers(2, 11, n_listings).astype('double'))
+                                 .mask(rng.random(n_listings) < .2)
+    })
+    for feature in FEATURES['features_to_fix']:
+        listings[feature] = maybe_missing(rng.choice(['t', 'f'], n_listings), rate=.01)
+    for i, feature in enumerate(FEATURES['features_w_dollar_signs']):
+        listings[feature] = maybe_missing(['${:,}.00'.format(price) for price in prices[:, i]])
+    # read_csv gives pandas' default text dtype
+    return listings.astype({feature: pd.Series(['']).dtype for feature in listings
+                            if listings[feature].dtype == 'object'})
+
+
+def legacy_rate(df, features):
+    for feature in features:
+        df[feature] = df[feature].str.replace(r'%', '', regex=True)
+        df[feature] = df[feature].astype('double')
+
+
+def legacy_flags(df, features):
+    for feature in features:
+        df[feature] = df[feature].replace({'t':True, 'f':False}).astype('bool')
+
+
+def legacy_lists(df):
+    df['host_verifications'] = df['host_verifications'].str.strip('[]').replace({r'(, )|(,)':'/', '\'':''}, regex=True)
+    df['amenities'] = df['amenities'].str.strip('{}').replace({r'(, )|(,)':'/', '\"':''}, regex=True)
+
+
+def legacy_currency(df, features):
+    for feature in features:
+        df[feature] = df[feature].str.replace(r'(\$)|(\,)', '', regex=True)
+        df[feature] = df[feature].astype('double')
+
+
+def legacy_zipcodes(df):
+    df['zipcode'] = df['zipcode'].str.replace(r'(-\d+)|(\s\d+)', '', regex=True)
+
+
+def parsed_rate(df, features):
+    df[features] = p.parse_percent(df[features])
+
+
+def parsed_flags(df, features):
+    df[features] = p.parse_flags(df[features])
+
+
+def parsed_lists(df):
+    df['host_verifications'] = p.parse_list(df['host_verifications'], '[]', '\'')
+    df['amenities'] = p.parse_list(df['amenities'], '{}', '\"')
+
+
+def parsed_currency(df, features):
+    df[features] = p.parse_currency(df[features])
+
+
+def parsed_zipcodes(df):
+    df['zipcode'] = p.parse_zipcodes(df['zipcode'])
+
+
+def time_call(func, *args, repeat=5):
+    '''the best of repeat calls of func on fresh copies of the frame'''
+    best = np.inf
+    for _ in range(repeat):
+        df = args[0].copy()
+        start = time.perf_counter()
+        func(df, *args[1:])
+        best = min(best, time.perf_counter() - start)
+    return df, best
+
+
+def main():
+    '''time each feature group of clean_airbnb_listings, the original code vs. the parsers
+    '''
+    steps = [('rates (%)', legacy_rate, parsed_rate, [FEATURES['rate_features']]),
+             ('t/f flags', legacy_flags, parsed_flags, [FEATURES['features_to_fix']]),
+             ('lists', legacy_lists, parsed_lists, []),
+             ('currency ($)', legacy_currency, parsed_currency, [FEATURES['features_w_dollar_signs']]),
+             ('zipcodes', legacy_zipcodes, parsed_zipcodes, [])]
+
+    print('{:<10} {:<14} {:>12} {:>12} {:>9}'.format('city', 'feature', 'original (s)', 'parsed (s)', 'speedup'))
+    for seed, (city, n_listings) in enumerate(CITIES.items()):
+        listings = make_listings(n_listings, seed)
+        for name, legacy, parsed, args in steps:
+            expected, legacy_time = time_call(legacy, listings, *args)
+            result, parsed_time = time_call(parsed, listings, *args)
+            pd.testing.assert_frame_equal(result, expected)
+            print('{:<10} {:<14} {:>12.4f} {:>12.4f} {:>8.1f}x'
+                  .format(city, name, legacy_time, parsed_time, legacy_time / parsed_time))
+
+        # the whole cleaning, with the parsers
+        cleaned, total_time = time_call(lambda df: c.clean_airbnb_listings(df, **copy.deepcopy(FEATURES)), listings)
+        print('{:<10} {:<14} {:>12} {:>12.4f}'.format(city, 'all', '', total_time))
+
+        start = time.perf_counter()
+        amenities, vocabulary = p.amenities_multi_hot(listings['amenities'])
+        multi_hot_time = time.perf_counter() - start
+        assert len(vocabulary) == len(set(AMENITIES) & set(vocabulary))
+        assert (np.asarray(amenities.sum(axis=1)).ravel() ==
+                listings['amenities'].str.count(',') + listings['amenities'].ne('{}')).all()
+        print('{:<10} {:<14} {:>12} {:>12.4f}  {} x {}, {:,} bytes vs. {:,} as strings'
+              .format(city, 'amenities', 'multi-hot', multi_hot_time, *amenities.shape,
+                      amenities.data.nbytes + amenities.indices.nbytes + amenities.indptr.nbytes,
+                      int(cleaned['amenities'].str.len().sum())))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+from functools import lru_cache
+import pandas as pd
+
+from .clean import make_clean_listings, make_clean_calendar
+
+
+logger = logging.getLogger(__name__)
+
+# the cleaning code is part of every key, so editing it invalidates the cache
+SOURCE_FILES = ['clean.py', 'parsers.py']
+
+
+@lru_cache(maxsize=None)
+def source_digest():
+    '''a hash of the cleaning_utils source the cached frames were made with
+    '''
+    digest = hashlib.sha256()
+    for name in SOURCE_FILES:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def file_digest(filepath, block_size=2**20):
+    '''the sha256 of a file's contents, read a block at a time
+    '''
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def dtype_to_json(dtype):
+    if isinstance(dtype, pd.CategoricalDtype):
+        return {'categories': dtype.categories.tolist(), 'ordered': bool(dtype.ordered)}
+    return str(dtype)
+
+
+def dtype_from_json(dtype):
+    if isinstance(dtype, dict):
+        return pd.CategoricalDtype(dtype['categories'], ordered=dtype['ordered'])
+    return dtype
+
+
+class SnapshotCache:
+    '''On-disk Parquet cache of cleaned Airbnb listings and calendars.
+
+       Every entry is keyed by a hash of the raw file's contents, the
+       configuration it was cleaned with (feature lists, read_csv dtypes...)
+       and the cleaning code, and is stored as a Parquet dataset split into
+       files of rows_per_file rows (or partitioned by partition_cols), so a
+       later run reads only the columns it asks for. Parquet does not keep
+       every pandas dtype (e.g. categoricals of numbers) so the dtypes are
+       saved next to the data and restored on load.
+
+       Loading an entry marks it as recently used and once the cache is
+       bigger than max_bytes the least recently used entries are deleted.
+       Hits, misses and evictions are logged to the 'cleaning_utils.cache'
+       logger and counted in hits and misses.
+
+       params:
+           location - directory to keep the cached frames in
+           max_bytes - the most bytes of Parquet to keep, None for no limit
+           rows_per_file - the number of rows in each Parquet file
+    '''
+    def __init__(self, location, max_bytes=2**30, rows_per_file=1000000):
+        self.location = location
+        self.max_bytes = max_bytes
+        self.rows_per_file = rows_per_file
+        self.hits = 0
+        self.misses = 0
+        # digests of the raw files already hashed, by (path, size, modification time)
+        self._digests = {}
+
+    def key(self, name, filepath, config):
+        '''the cache key of the frame name made from filepath with config
+        '''
+        stat = os.stat(filepath)
+        signature = (os.path.abspath(filepath), stat.st_size, stat.st_mtime_ns)
+        if signature not in self._digests:
+            self._digests[signature] = file_digest(filepath)
+        key = json.dumps([name, self._digests[signature], config, source_digest()],
+                         sort_keys=True, default=str)
+        return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+    def load(self, name, filepath, config, build, columns=None, partition_cols=None):
+        '''Load a cleaned frame from the cache, building and storing it on a miss.
+
+           params:
+               name - the kind of frame, e.g. 'listings'
+               filepath - the raw file the frame is made from
+               config - a JSON serializable description of how it is made
+               build - a function of no arguments returning the cleaned frame
+               columns - only load these columns, None for all of them
+               partition_cols - columns to partition the Parquet dataset by,
+                                the rows then come back grouped by partition
+           returns:
+               df - the cleaned Pandas.DataFrame with a fresh RangeIndex
+        '''
+        path = os.path.join(self.location, self.key(name, filepath, config))
+        if os.path.isdir(path):
+            self.hits += 1
+            logger.info('hit %s %s', name, filepath)
+            # the modification time of an entry is its last use
+            os.utime(path)
+            return self._read(path, columns)
+
+        self.misses += 1
+        logger.info('miss %s %s', name, filepath)
+        self._write(build(), path, partition_cols)
+        self.evict(keep=path)
+        return self._read(path, columns)
+
+    def _write(self, df, path, partition_cols):
+        os.makedirs(self.location, exist_ok=True)
+        # write into a temporary directory first so readers never see half an entry
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        data_path = os.path.join(tmp_path, 'data')
+        df = df.reset_index(drop=True)
+        if partition_cols:
+            # hive style directories, but the partition columns stay in the
+            # files so they are read back with their own dtype
+            for values, part in df.groupby(partition_cols, sort=False, observed=True, dropna=False):
+                values = values if isinstance(values, tuple) else (values,)
+                self._write_files(part, os.path.join(data_path, *['{}={}'.format(feature, value)
+                                                                  for feature, value in zip(partition_cols, values)]))
+        else:
+            self._write_files(df, data_path)
+        with open(os.path.join(tmp_path, 'dtypes.json'), 'w') as f:
+            json.dump({feature: dtype_to_json(dtype) for feature, dtype in df.dtypes.items()}, f, default=str)
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # another process stored the same entry first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    def _write_files(self, df, directory):
+        os.makedirs(directory)
+        for part, start in enumerate(range(0, max(len(df), 1), self.rows_per_file)):
+            df.iloc[start:start + self.rows_per_file]\
+              .to_parquet(os.path.join(directory, 'part-{:05d}.parquet'.format(part)), index=False)
+
+    def _read(self, path, columns):
+        with open(os.path.join(path, 'dtypes.json')) as f:
+            dtypes = json.load(f)
+        columns = list(dtypes) if columns is None else list(columns)
+        df = pd.read_parquet(os.path.join(path, 'data'), columns=columns, partitioning=None)
+        return df.astype({feature: dtype_from_json(dtypes[feature]) for feature in columns})
+
+    def entries(self):
+        '''the cached entries as a Pandas.DataFrame of 'path', 'size' and
+           'last_used', least recently used first
+        '''
+        rows = []
+        if os.path.isdir(self.location):
+            for entry in os.scandir(self.location):
+                if entry.is_dir() and not entry.name.endswith('.tmp'):
+                    size = sum(os.path.getsize(os.path.join(root, name))
+                               for root, _, files in os.walk(entry.path) for name in files)
+                    rows.append((entry.path, size, entry.stat().st_mtime))
+        return pd.DataFrame(rows, columns=['path', 'size', 'last_used']).sort_values('last_used', ignore_index=True)
+
+    def evict(self, keep=None):
+        '''delete the least recently used entries until the cache fits in max_bytes
+
+           params:
+               keep - the path of an entry not to delete, e.g. the one just stored
+        '''
+        if self.max_bytes is None:
+            return
+        entries = self.entries()
+        total = entries['size'].sum()
+        for path, size in zip(entries['path'], entries['size']):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            logger.info('evict %s (%d bytes)', path, size)
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        '''delete the cache directory and everything in it
+        '''
+        shutil.rmtree(self.location, ignore_errors=True)
+
+
+def cached_clean_listings(cache, filepath, features_dict, columns=None, **read_csv_kwargs):
+    '''make_clean_listings of a listings.csv, through a SnapshotCache
+
+       params:
+           cache - a SnapshotCache
+           filepath - a path to a listings.csv
+           features_dict - the dictionary make_clean_listings takes
+           columns - only load these columns, None for all of them
+           read_csv_kwargs - passed to pd.read_csv, e.g. dtype or parse_dates
+       returns:
+           clean_df - the cleaned listings as a Pandas.DataFrame
+    '''
+    def build():
+        return make_clean_listings(pd.read_csv(filepath, **read_csv_kwargs), **features_dict)
+    config = {'features_dict': features_dict, 'read_csv': read_csv_kwargs}
+    return cache.load('listings', filepath, config, build, columns=columns)
+
+
+def cached_clean_calendar(cache, filepath, columns=None, **read_csv_kwargs):
+    '''make_clean_calendar of a calendar.csv, through a SnapshotCache
+
+       params:
+           cache - a SnapshotCache
+           filepath - a path to a calendar.csv
+           columns - only load these columns, None for all of them
+           read_csv_kwargs - passed to pd.read_csv, e.g. parse_dates
+       returns:
+           clean_df - the cleaned calendar as a Pandas.DataFrame
+    '''
+    def build():
+        return make_clean_calendar(pd.read_csv(filepath, **read_csv_kwargs))
+    return cache.load('calendar', filepath, {'read_csv': read_csv_kwargs}, build, columns=columns)
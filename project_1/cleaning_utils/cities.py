@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import argparse
+from multiprocessing import Pool
+import pandas as pd
+
+from .clean import clean_airbnb_calendar, compact_dtypes, make_clean_listings, make_aggregated_dataframe
+
+
+# the price aggregates of data_cleaning.ipynb, name: pandas aggregation
+AGGREGATIONS = {'mean_price': 'mean', 'stand_dev_price': 'std', 'median_price': 'median'}
+FILE_FORMATS = ('csv', 'parquet')
+
+
+def city_name(directory):
+    '''the city of a snapshot directory, e.g. './boston_data' is 'Boston'
+    '''
+    name = os.path.basename(os.path.normpath(directory))
+    if name.endswith('_data'):
+        name = name[:-len('_data')]
+    return name.replace('_', ' ').title()
+
+
+def write_frame(df, output_dir, name, file_format):
+    path = os.path.join(output_dir, '{}.{}'.format(name, file_format))
+    if file_format == 'parquet':
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+    return path
+
+
+def clean_city(city, directory, features_dict, output_dir=None, file_format='csv'):
+    '''Clean and aggregate the listings.csv and calendar.csv of one city.
+
+       Runs the steps of data_cleaning.ipynb: clean the listings and the
+       calendar, aggregate the calendar's prices by listing and merge them
+       into the listings with a 'city' feature.
+
+       params:
+           city - the name of the city, e.g. 'Boston'
+           directory - the directory with the city's listings.csv and calendar.csv
+           features_dict - the dictionary clean_airbnb_listings takes
+           output_dir - write <city>_listings and <city>_calendar here, None to
+                        not write anything
+           file_format - 'csv' or 'parquet'
+       returns:
+           merged - the city's cleaned listings with their price aggregates
+           summary - a dict of the number of listings and calendar rows and
+                     the seconds taken
+    '''
+    start = time.perf_counter()
+    listings = make_clean_listings(pd.read_csv(os.path.join(directory, 'listings.csv'),
+                                               parse_dates=['host_since']), **features_dict)
+    calendar = pd.read_csv(os.path.join(directory, 'calendar.csv'), parse_dates=['date'])
+    clean_airbnb_calendar(calendar)
+
+    # aggregate the prices before they are made float32, like the notebook
+    aggregated = make_aggregated_dataframe(calendar, list(AGGREGATIONS.values()), list(AGGREGATIONS))
+    calendar = compact_dtypes(calendar, id_features=['listing_id'], float_features=['price'])
+    aggregated = aggregated.astype({'listing_id': calendar['listing_id'].dtype})
+    merged = listings.merge(aggregated, left_on='id', right_on='listing_id', how='left')
+    merged['city'] = city
+
+    if output_dir is not None:
+        prefix = city.lower().replace(' ', '_')
+        write_frame(listings, output_dir, prefix + '_listings', file_format)
+        write_frame(calendar, output_dir, prefix + '_calendar', file_format)
+    summary = {'city': city, 'listings': len(listings), 'calendar_rows': len(calendar),
+               'seconds': time.perf_counter() - start}
+    return merged, summary
+
+
+def _clean_city(args):
+    return clean_city(*args)
+
+
+def concat_cities(frames):
+    '''Concatenate the cities' frames row-wise, keeping categorical features
+       categorical even when the cities have different categories
+    '''
+    merged = pd.concat(frames, ignore_index=True)
+    categorical = {feature for frame in frames for feature, dtype in frame.dtypes.items()
+                   if isinstance(dtype, pd.CategoricalDtype)} | {'city'}
+    return merged.astype({feature: 'category' for feature in categorical
+                          if not isinstance(merged[feature].dtype, pd.CategoricalDtype)})
+
+
+def clean_cities(cities, features_dict, output_dir=None, n_jobs=None, file_format='csv'):
+    '''Clean and aggregate several cities at once, one city per process.
+
+       params:
+           cities - a dictionary mapping names of cities to their snapshot
+                    directories, or a list of directories named like 'boston_data'
+           features_dict - the dictionary clean_airbnb_listings takes, shared
+                           by every city
+           output_dir - write each city's cleaned listings and calendar and the
+                        merged calendar_listings here, None to not write anything
+           n_jobs - number of processes, None uses every core
+           file_format - 'csv' or 'parquet'
+       returns:
+           calendar_listings - the merged listings of every city
+           summaries - a Pandas.DataFrame with a row per city
+    '''
+    if file_format not in FILE_FORMATS:
+        raise ValueError('file_format must be one of {}'.format(FILE_FORMATS))
+    if not isinstance(cities, dict):
+        cities = {city_name(directory): directory for directory in cities}
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+
+    tasks = [(city, directory, features_dict, output_dir, file_format) for city, directory in cities.items()]
+    n_jobs = min(n_jobs or os.cpu_count(), len(tasks))
+    if n_jobs <= 1:
+        results = [_clean_city(task) for task in tasks]
+    else:
+        # cities are uneven in size, so hand them out one at a time
+        with Pool(n_jobs) as pool:
+            results = pool.map(_clean_city, tasks, chunksize=1)
+
+    calendar_listings = concat_cities([merged for merged, _ in results])
+    if output_dir is not None:
+        write_frame(calendar_listings, output_dir, 'calendar_listings', file_format)
+    return calendar_listings, pd.DataFrame([summary for _, summary in results])
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(
+        description='Clean and aggregate the Inside Airbnb snapshots of several cities in parallel.')
+    parser.add_argument('directories', nargs='+',
+                        help='snapshot directories with a listings.csv and a calendar.csv, '
+                             'named like boston_data or given as City=directory')
+    parser.add_argument('--config', default='cleaning_config.json',
+                        help='JSON file with the features_dict shared by every city')
+    parser.add_argument('--output-dir', default='.', help='directory to write the cleaned files to')
+    parser.add_argument('--n-jobs', type=int, default=None, help='number of processes, every core by default')
+    parser.add_argument('--format', choices=FILE_FORMATS, default='csv', help='format of the written files')
+    return parser.parse_args(args)
+
+
+def main():
+    args = parse_args()
+    cities = {}
+    for directory in args.directories:
+        city, _, path = directory.rpartition('=')
+        cities[city or city_name(path)] = path
+
+    with open(args.config) as f:
+        features_dict = json.load(f)
+
+    print('Cleaning {} cities...'.format(len(cities)))
+    start = time.perf_counter()
+    calendar_listings, summaries = clean_cities(cities, features_dict, args.output_dir,
+                                                args.n_jobs, args.format)
+    print(summaries.to_string(index=False))
+    print('{:,} listings cleaned in {:.1f}s, saved to {}'
+          .format(len(calendar_listings), time.perf_counter() - start, args.output_dir))
+
+
+if __name__ == '__main__':
+    main()
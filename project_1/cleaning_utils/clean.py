@@ -1,5 +1,14 @@
+import numpy as np
 import pandas as pd
 
+from .parsers import parse_currency, parse_percent, parse_flags, parse_list, parse_zipcodes
+
+
+# numpy reductions that pandas runs as its own groupby methods, std with ddof=1
+GROUPBY_FUNCS = {np.mean: 'mean', np.std: 'std', np.median: 'median',
+                 np.sum: 'sum', np.min: 'min', np.max: 'max'}
+SORTED_FUNCS = ('mean', 'std', 'median', 'sum', 'min', 'max', 'count')
+
 
 def clean_airbnb_listings(df, **features_dict):
     '''clean airbnb dataset.
@@ -20,8 +29,9 @@ def clean_airbnb_listings(df, **features_dict):
     features_w_nas_to_drop = features_dict['features_w_nas_to_drop']
     missing_features = features_dict['missing_features']
     
-    # merge features_to_drop and features_w_nas_to_drop
-    features_to_drop.extend(features_w_nas_to_drop)
+    # merge features_to_drop and features_w_nas_to_drop into a new list,
+    # leaving the caller's lists as they are
+    features_to_drop = list(features_to_drop) + list(features_w_nas_to_drop)
     
     # make a list of the features (columns) to drop and then drop them from
     # the dataset
@@ -29,26 +39,24 @@ def clean_airbnb_listings(df, **features_dict):
     df.drop(columns=features_to_drop, inplace=True)
     
     # replace the % sign in the variables that represent a rate
-    for feature in features_dict['rate_features']:
-        df[feature] = df[feature].str.replace(r'%', '', regex=True)
-        df[feature] = df[feature].astype('double')
+    rate_features = features_dict['rate_features']
+    df[rate_features] = parse_percent(df[rate_features])
     
     # map the 't' and 'f' to their respective boolean values
-    for feature in features_dict['features_to_fix']:
-        df[feature] = df[feature].replace({'t':True, 'f':False}).astype('bool')
+    features_to_fix = features_dict['features_to_fix']
+    df[features_to_fix] = parse_flags(df[features_to_fix])
      
     # give amenities and host_verifications a more concise appearance
     # see data quality issues 3-4
-    df['host_verifications'] = df['host_verifications'].str.strip('[]').replace({r'(, )|(,)':'/', '\'':''}, regex=True)
-    df['amenities'] = df['amenities'].str.strip('{}').replace({r'(, )|(,)':'/', '\"':''}, regex=True)
+    df['host_verifications'] = parse_list(df['host_verifications'], '[]', '\'')
+    df['amenities'] = parse_list(df['amenities'], '{}', '\"')
     
     # remove the dollar signs from currency based features and convert to double dtype
-    for feature in features_dict['features_w_dollar_signs']:
-        df[feature] = df[feature].str.replace(r'(\$)|(\,)', '', regex=True)
-        df[feature] = df[feature].astype('double')
+    features_w_dollar_signs = features_dict['features_w_dollar_signs']
+    df[features_w_dollar_signs] = parse_currency(df[features_w_dollar_signs])
        
     # remove routing numbers from zipcodes
-    df['zipcode'] = df['zipcode'].str.replace(r'(-\d+)|(\s\d+)', '', regex=True)
+    df['zipcode'] = parse_zipcodes(df['zipcode'])
     
     # remove empty features
     df.drop(columns=features_dict['empty_features'], inplace=True)
@@ -101,21 +109,185 @@ def clean_airbnb_calendar(df):
     # Remove the $ sign for automatic numeric parsing
     df['price'] = df['price'].str.replace(r'(\$)|(,)', '', regex=True).str.strip().astype('double')
 
-def make_aggregated_dataframe(df, list_of_funcs, names_of_funcs):
+
+def compact_dtypes(df, id_features=(), float_features=(), category_ratio=0.5, pyarrow_strings=False):
+    '''Return a copy of a cleaned Airbnb dataset with smaller dtypes.
+    
+       params:
+           df - a Pandas.DataFrame
+           id_features - integer id columns, stored as int32 when every id
+                         fits and int64 otherwise
+           float_features - double columns to store as float32, e.g. prices
+           category_ratio - text columns with at most this many distinct
+                            values per row become 'category'
+           pyarrow_strings - store the other text columns as 'string[pyarrow]'
+       returns:
+           compact_df - a new Pandas.DataFrame with the same values
+    '''
+    dtypes = {}
+    for feature in id_features:
+        ids = pd.to_numeric(df[feature])
+        fits = ids.empty or (ids.min() >= np.iinfo('int32').min and ids.max() <= np.iinfo('int32').max)
+        dtypes[feature] = 'int32' if fits else 'int64'
+    for feature in float_features:
+        dtypes[feature] = 'float32'
+    
+    for feature in df.columns.difference(list(dtypes), sort=False):
+        series = df[feature]
+        if not (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)) \
+           or isinstance(series.dtype, pd.CategoricalDtype):
+            continue
+        kind = pd.api.types.infer_dtype(series, skipna=True)
+        if kind == 'boolean':
+            # 't'/'f' mapped to True/False, with missing values when there are any
+            dtypes[feature] = 'boolean' if series.isna().any() else 'bool'
+        elif kind in ('string', 'empty'):
+            if series.nunique() <= category_ratio * len(series):
+                dtypes[feature] = 'category'
+            elif pyarrow_strings:
+                dtypes[feature] = 'string[pyarrow]'
+    return df.astype(dtypes)
+
+
+def memory_usage(df):
+    '''the number of bytes a Pandas.DataFrame uses, including its Python strings
+    '''
+    return int(df.memory_usage(deep=True).sum())
+
+
+def make_clean_listings(df, pyarrow_strings=False, verbose=False, **features_dict):
+    '''Clean a copy of an airbnb listings dataset and give it compact dtypes.
+    
+       Unlike clean_airbnb_listings neither df nor features_dict are changed,
+       so several snapshots can be cleaned at the same time.
+    
+       params:
+           df - a Pandas.DataFrame of listings.csv
+           pyarrow_strings - see compact_dtypes
+           verbose - print the memory used before and after
+           features_dict - the same dictionary clean_airbnb_listings takes
+       returns:
+           clean_df - a new, cleaned Pandas.DataFrame with an int32 'id',
+                      float32 prices and rates and categorical low
+                      cardinality text
+    '''
+    clean_df = df.copy()
+    clean_airbnb_listings(clean_df, **features_dict)
+    clean_df = compact_dtypes(clean_df, id_features=['id'],
+                              float_features=features_dict['features_w_dollar_signs'] + features_dict['rate_features'],
+                              pyarrow_strings=pyarrow_strings)
+    if verbose:
+        print_memory_usage(df, clean_df)
+    return clean_df
+
+
+def make_clean_calendar(df, pyarrow_strings=False, verbose=False):
+    '''Clean a copy of an airbnb calendar dataset and give it compact dtypes.
+    
+       params:
+           df - a Pandas.DataFrame of calendar.csv
+           pyarrow_strings - see compact_dtypes
+           verbose - print the memory used before and after
+       returns:
+           clean_df - a new, cleaned Pandas.DataFrame with an int32
+                      'listing_id', a boolean 'available' and a float32 'price'
+    '''
+    clean_df = df.copy()
+    clean_airbnb_calendar(clean_df)
+    clean_df = compact_dtypes(clean_df, id_features=['listing_id'], float_features=['price'],
+                              pyarrow_strings=pyarrow_strings)
+    if verbose:
+        print_memory_usage(df, clean_df)
+    return clean_df
+
+
+def print_memory_usage(before, after):
+    '''print the memory used by a dataset before and after cleaning
+    '''
+    before, after = memory_usage(before), memory_usage(after)
+    print('memory: {:,.1f} MB -> {:,.1f} MB ({:.0%})'.format(before / 2**20, after / 2**20, after / before))
+
+
+def make_aggregated_dataframe(df, list_of_funcs, names_of_funcs, is_sorted=False):
     '''Aggregate Airbnb calendar datasetts by property id and merge.
     
-       Aggregate Airbnb calendar datasets by property id. Aggregate values will
-       be contained in their own data frame. This function will combine all aggregate
-       data frames into one data frame.
+       Aggregate the price of Airbnb calendar datasets by property id. All of
+       the aggregates are computed together in a single groupby pass and
+       returned as one data frame, one row per property in order of first
+       appearance.
+
+       params:
+           df - a cleaned Airbnb calendar as a Pandas.DataFrame
+           list_of_funcs - functions (or names of pandas aggregations) to apply to price
+           names_of_funcs - the name of the column for each function
+           is_sorted - True if the rows of each property are contiguous, as in
+                       Inside Airbnb calendar.csv files. Mean, std, median, sum,
+                       min, max and count are then computed with NumPy reduceat
+                       instead of a groupby.
+       returns:
+           aggregated_dataframe - a Pandas.DataFrame with 'listing_id' and a
+                                  column per function
+    '''
+    funcs = [GROUPBY_FUNCS.get(func, func) for func in list_of_funcs]
+    
+    # Drop all rows that have missing price value, only listing_id and price are needed
+    prices = df.loc[df['price'].notna(), ['listing_id', 'price']]
+    
+    if is_sorted and len(prices) and all(func in SORTED_FUNCS for func in funcs):
+        return aggregate_sorted_prices(prices, funcs, names_of_funcs)
+    
+    aggregated_dataframe = prices.groupby('listing_id', sort=False)['price']\
+                                 .agg(**dict(zip(names_of_funcs, funcs)))
+    # keep the dtype of the ids, groupby may infer a new one for object columns
+    return aggregated_dataframe.reset_index().astype({'listing_id': prices['listing_id'].dtype})
+
+
+def aggregate_sorted_prices(prices, funcs, names_of_funcs):
+    '''Aggregate prices whose rows are already grouped by listing_id.
+    
+       params:
+           prices - a Pandas.DataFrame of 'listing_id' and non-missing 'price'
+                    with the rows of each listing next to each other
+           funcs - names of aggregations, each one of SORTED_FUNCS
+           names_of_funcs - the name of the column for each function
+       returns:
+           aggregated_dataframe - a Pandas.DataFrame with 'listing_id' and a
+                                  column per function
     '''
-    # Drop all rows that have missing price value
-    calendar_no_nas = df.dropna(subset=['price']).drop(columns=['available']).copy(deep=True)
+    ids = prices['listing_id'].to_numpy()
+    values = prices['price'].to_numpy(dtype='double')
     
-    # Create dataframe with a single Pandas.Series filled with the property/listing ids
-    aggregated_dataframe = pd.DataFrame(data=calendar_no_nas['listing_id'].unique(), columns=['listing_id'])
+    # each listing's rows start where the id changes
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    if len(pd.unique(ids[starts])) != len(starts):
+        raise ValueError('the rows of each listing_id must be contiguous when is_sorted=True')
+    counts = np.diff(np.r_[starts, len(values)])
+    means = np.add.reduceat(values, starts) / counts
     
-    # Calculate the aggregate for each property id, then merge the result into the aggregated_dataframe.
-    # Will end up with a data frame with len(list_of_funcs) + 1.
-    for func, name in zip(list_of_funcs, names_of_funcs):
-        aggregated_dataframe = aggregated_dataframe.merge(calendar_no_nas.groupby('listing_id').agg(func)['price'].reset_index(name=name), on='listing_id')
+    aggregated_dataframe = pd.DataFrame({'listing_id': ids[starts]})
+    for func, name in zip(funcs, names_of_funcs):
+        if func == 'mean':
+            aggregated_dataframe[name] = means
+        elif func == 'std':
+            deviations = values - np.repeat(means, counts)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                aggregated_dataframe[name] = np.sqrt(np.add.reduceat(deviations**2, starts) / (counts - 1))
+        elif func == 'median':
+            # sort the prices within each listing with one integer sort of
+            # (listing, rank of price) keys, then average the middle one or two
+            order = np.argsort(values)
+            ranks = np.empty(len(values), dtype=np.int64)
+            ranks[order] = np.arange(len(values))
+            groups = np.repeat(np.arange(len(starts), dtype=np.int64), counts)
+            sorted_values = values[order][np.sort(groups * len(values) + ranks) % len(values)]
+            aggregated_dataframe[name] = (sorted_values[starts + (counts - 1) // 2] +
+                                          sorted_values[starts + counts // 2]) / 2
+        elif func == 'sum':
+            aggregated_dataframe[name] = np.add.reduceat(values, starts)
+        elif func == 'min':
+            aggregated_dataframe[name] = np.minimum.reduceat(values, starts)
+        elif func == 'max':
+            aggregated_dataframe[name] = np.maximum.reduceat(values, starts)
+        else:
+            aggregated_dataframe[name] = counts
     return aggregated_dataframe
@@ -0,0 +1,124 @@
+import re
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+# the characters each kind of number is written with, removed before parsing
+CURRENCY_CHARS = ('$', ',')
+PERCENT_CHARS = ('%',)
+LIST_SEPARATOR = re.compile(r', ?')
+# kept as a string: pandas hands string patterns to pyarrow's regex engine
+# when the column is pyarrow backed, a compiled re.Pattern forces Python's
+ZIPCODE_SUFFIX = r'(-\d+)|(\s\d+)'
+
+
+def parse_numbers(df, chars):
+    '''Parse text columns into doubles after deleting some characters.
+
+       The columns are stacked into a single Series so each character is
+       removed with one literal (not regex) replace over all of them and the
+       result is converted to doubles once.
+
+       params:
+           df - a Pandas.DataFrame of the text columns to parse
+           chars - the characters to delete, e.g. CURRENCY_CHARS
+       returns:
+           parsed - a Pandas.DataFrame of doubles with the same index and columns
+    '''
+    stacked = pd.concat([df[feature] for feature in df.columns], ignore_index=True)
+    # columns read as all missing are already numeric
+    if not pd.api.types.is_numeric_dtype(stacked):
+        for char in chars:
+            stacked = stacked.str.replace(char, '', regex=False)
+    parsed = stacked.astype('double').to_numpy()
+    return pd.DataFrame(parsed.reshape(df.shape[1], df.shape[0]).T, index=df.index, columns=df.columns)
+
+
+def parse_currency(df):
+    '''Parse '$1,200.00' style columns into doubles, see parse_numbers
+    '''
+    return parse_numbers(df, CURRENCY_CHARS)
+
+
+def parse_percent(df):
+    '''Parse '95%' style columns into doubles, see parse_numbers
+    '''
+    return parse_numbers(df, PERCENT_CHARS)
+
+
+def parse_flags(df):
+    '''Parse 't'/'f' columns into booleans.
+
+       Matches .replace({'t':True, 'f':False}).astype('bool'): 'f' and empty
+       strings are False, everything else (including missing values) is True.
+
+       params:
+           df - a Pandas.DataFrame of 't'/'f' columns
+       returns:
+           parsed - a Pandas.DataFrame of booleans with the same index and columns
+    '''
+    values = df.to_numpy(dtype='object')
+    parsed = (values != 'f') & (values != '')
+    # columns that are already boolean are kept as they are
+    already_bool = (df.dtypes == 'bool').to_numpy()
+    parsed[:, already_bool] = values[:, already_bool].astype('bool')
+    return pd.DataFrame(parsed, index=df.index, columns=df.columns)
+
+
+def parse_list(series, brackets, quote):
+    '''Turn "{a,"b c",d}" style lists into 'a/b c/d' strings.
+
+       Each value is stripped, split and unquoted in one pass instead of
+       three pandas string operations.
+
+       params:
+           series - a Pandas.Series of lists as text
+           brackets - the characters around each list, e.g. '{}'
+           quote - the character quoting the items, e.g. '"'
+       returns:
+           parsed - a Pandas.Series of '/' separated items, missing values are kept
+    '''
+    table = str.maketrans('', '', quote)
+    sub = LIST_SEPARATOR.sub
+    return pd.Series([sub('/', value.strip(brackets)).translate(table) if isinstance(value, str) else value
+                      for value in series.to_numpy(dtype='object')],
+                     index=series.index, name=series.name, dtype=series.dtype)
+
+
+def parse_zipcodes(series):
+    '''remove the routing numbers from zipcodes, e.g. '02134-1234' becomes '02134'
+    '''
+    return series.str.replace(ZIPCODE_SUFFIX, '', regex=True)
+
+
+def amenities_multi_hot(series, brackets='{}', quote='"'):
+    '''Encode the raw amenities lists as a sparse multi-hot matrix.
+
+       Works on the listings.csv text, e.g. '{TV,"Family/Kid Friendly"}',
+       since amenities such as 'Family/Kid Friendly' contain the '/' that
+       clean_airbnb_listings joins them with.
+
+       params:
+           series - a Pandas.Series of the raw amenities lists
+           brackets - the characters around each list
+           quote - the character quoting the amenities
+       returns:
+           matrix - a scipy.sparse CSR matrix of 0/1 int8 with a row per listing
+                    and a column per amenity, missing values are empty rows
+           vocabulary - a Pandas.Index of the amenity of each column
+    '''
+    table = str.maketrans('', '', quote)
+    rows, items = [], []
+    for row, value in enumerate(series.to_numpy(dtype='object')):
+        if isinstance(value, str):
+            for item in LIST_SEPARATOR.split(value.strip(brackets).translate(table)):
+                if item:
+                    rows.append(row)
+                    items.append(item)
+    codes, vocabulary = pd.factorize(pd.Series(items, dtype='object'), sort=True)
+    matrix = sparse.csr_matrix((np.ones(len(codes), dtype='int8'), (rows, codes)),
+                               shape=(len(series), len(vocabulary)))
+    # an amenity listed twice still counts once
+    matrix.data[:] = 1
+    return matrix, pd.Index(vocabulary, name=series.name)
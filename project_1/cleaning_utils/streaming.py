@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+
+from .clean import clean_airbnb_calendar
+
+
+# prices of 0 (or less) are counted in a bucket of their own
+ZERO_BUCKET = np.iinfo(np.int64).min
+
+
+class CalendarAggregator:
+    '''Running per-listing price aggregates of an Airbnb calendar fed in chunks.
+
+       Keeps the count, sum, sum of squares, min and max of the price of every
+       listing plus a log-bucketed quantile sketch (as in DDSketch) for the
+       median, so memory grows with the number of listings and not with the
+       number of calendar rows. Aggregators of different chunks, files or
+       processes can be merged.
+
+       params:
+           relative_accuracy - the medians are within this relative error of
+                               the exact medians
+    '''
+    def __init__(self, relative_accuracy=0.005):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.moments = pd.DataFrame(columns=['count', 'sum', 'sumsq', 'min', 'max'], dtype='double')
+        # the number of prices of each listing that fall in each bucket,
+        # indexed by (listing_id, bucket)
+        self.buckets = pd.Series(dtype='int64')
+
+    def update(self, df):
+        '''Fold a cleaned calendar chunk into the aggregates.
+
+           params:
+               df - a chunk of a calendar cleaned by clean_airbnb_calendar
+           returns:
+               self
+        '''
+        prices = df.loc[df['price'].notna(), ['listing_id', 'price']]
+        prices = prices.assign(sumsq=prices['price']**2, bucket=self.bucket(prices['price']))
+        grouped = prices.groupby('listing_id', sort=False)
+        moments = pd.DataFrame({'count': grouped['price'].count(), 'sum': grouped['price'].sum(),
+                                'sumsq': grouped['sumsq'].sum(), 'min': grouped['price'].min(),
+                                'max': grouped['price'].max()})
+        buckets = prices.groupby(['listing_id', 'bucket'], sort=False).size()
+        self._combine(moments, buckets)
+        return self
+
+    def merge(self, other):
+        '''Fold the aggregates of another CalendarAggregator into this one.
+
+           params:
+               other - a CalendarAggregator with the same relative_accuracy
+           returns:
+               self
+        '''
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError('can only merge aggregators with the same relative_accuracy')
+        self._combine(other.moments, other.buckets)
+        return self
+
+    def _combine(self, moments, buckets):
+        if len(self.moments):
+            moments = pd.concat([self.moments, moments]).groupby(level=0, sort=False)\
+                        .agg({'count': 'sum', 'sum': 'sum', 'sumsq': 'sum', 'min': 'min', 'max': 'max'})
+            buckets = pd.concat([self.buckets, buckets]).groupby(level=[0, 1], sort=False).sum()
+        self.moments = moments
+        self.buckets = buckets
+
+    def bucket(self, price):
+        '''the sketch bucket of each price: ceil(log(price) / log(gamma))
+        '''
+        with np.errstate(divide='ignore', invalid='ignore'):
+            buckets = np.ceil(np.log(price.to_numpy(dtype='double')) / np.log(self.gamma))
+        return np.where(price.to_numpy() > 0, buckets, ZERO_BUCKET).astype(np.int64)
+
+    def bucket_value(self, bucket):
+        '''the price that represents each bucket, within relative_accuracy of its prices
+        '''
+        with np.errstate(over='ignore', under='ignore'):
+            values = 2 * self.gamma**bucket.astype('double') / (self.gamma + 1)
+        return np.where(bucket == ZERO_BUCKET, 0., values)
+
+    def medians(self):
+        '''the approximate median price of every listing
+
+           returns:
+               a Pandas.Series of medians indexed by listing_id
+        '''
+        buckets = self.buckets.sort_index()
+        listing_ids = buckets.index.get_level_values(0)
+        counts = buckets.to_numpy()
+        cumulative = buckets.groupby(level=0, sort=False).cumsum().to_numpy()
+        before = cumulative - counts
+        totals = buckets.groupby(level=0, sort=False).transform('sum').to_numpy()
+        values = self.bucket_value(buckets.index.get_level_values(1).to_numpy())
+
+        # average the two middle prices (the same one for an odd count),
+        # each found in the bucket whose cumulative count passes its rank
+        middle = np.zeros(len(counts))
+        for rank in [(totals - 1) // 2, totals // 2]:
+            middle += np.where((before <= rank) & (rank < cumulative), values, 0.)
+        return pd.Series(middle / 2, index=listing_ids).groupby(level=0, sort=False).sum()
+
+    def result(self):
+        '''The aggregates of every listing seen so far.
+
+           returns:
+               aggregated_dataframe - a Pandas.DataFrame with 'listing_id', 'count',
+                                      'mean_price', 'stand_dev_price',
+                                      'median_price', 'min_price' and 'max_price'
+        '''
+        moments = self.moments
+        mean = moments['sum'] / moments['count']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            variance = ((moments['sumsq'] - moments['sum'] * mean) / (moments['count'] - 1)).clip(lower=0)
+        return pd.DataFrame({
+            'listing_id': moments.index.to_numpy(),
+            'count': moments['count'].to_numpy(dtype='int64'),
+            'mean_price': mean.to_numpy(),
+            'stand_dev_price': np.sqrt(variance.where(moments['count'] > 1)).to_numpy(),
+            'median_price': self.medians().reindex(moments.index).to_numpy(),
+            'min_price': moments['min'].to_numpy(),
+            'max_price': moments['max'].to_numpy()
+        })
+
+
+def aggregate_calendar_csv(filepath, chunksize=1000000, relative_accuracy=0.005):
+    '''Clean and aggregate an Inside Airbnb calendar.csv without loading it all.
+
+       Each chunk is cleaned with clean_airbnb_calendar, the same 't'/'f' and
+       price rules as the in-memory cleaning, and folded into a
+       CalendarAggregator.
+
+       params:
+           filepath - a path to a calendar.csv
+           chunksize - the number of rows to read at a time
+           relative_accuracy - the relative error allowed in the medians
+       returns:
+           aggregated_dataframe - see CalendarAggregator.result
+    '''
+    aggregator = CalendarAggregator(relative_accuracy)
+    # read the price as text even in chunks where it is all missing
+    for chunk in pd.read_csv(filepath, usecols=['listing_id', 'available', 'price'],
+                             dtype={'available': object, 'price': object}, chunksize=chunksize):
+        clean_airbnb_calendar(chunk)
+        aggregator.update(chunk)
+    return aggregator.result()
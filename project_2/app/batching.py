@@ -0,0 +1,85 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    '''Gather concurrent prediction requests into a single model.predict call
+
+       Requests are queued and a background thread waits up to max_wait
+       seconds after the first one for more to arrive (or until max_batch_size
+       messages are queued), predicts them all at once and hands each caller
+       its own rows. A request larger than max_batch_size is queued in
+       max_batch_size slices, so no batch goes over the cap. This pays the pipeline's per-call overhead once per batch
+       instead of once per request.
+
+       params:
+           predict - a function mapping a list of messages to an array of labels
+           max_batch_size - the most messages to predict in one call
+           max_wait - seconds to wait for a batch to fill, 0 disables batching
+    '''
+    def __init__(self, predict, max_batch_size=64, max_wait=0.005):
+        self.predict = predict
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, messages):
+        '''predict the labels for a list of messages
+
+           params:
+               messages - a list of strings
+           returns:
+               the rows of predict(messages), in the same order
+        '''
+        if self.max_wait <= 0 or self.max_batch_size <= 1:
+            return self.predict(messages)
+
+        # started on first use so forked server workers each get their own thread
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+        futures = []
+        for start in range(0, len(messages), self.max_batch_size):
+            futures.append(Future())
+            self._queue.put((messages[start:start + self.max_batch_size], futures[-1]))
+        if len(futures) == 1:
+            return futures[0].result()
+        return [row for future in futures for row in future.result()]
+
+    def _next_batch(self):
+        requests = [self._queue.get()]
+        size = len(requests[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            requests.append(request)
+            size += len(request[0])
+        return requests
+
+    def _run(self):
+        while True:
+            requests = self._next_batch()
+            messages = [message for batch, _ in requests for message in batch]
+            try:
+                predictions = self.predict(messages)
+            except Exception as error:
+                for _, future in requests:
+                    future.set_exception(error)
+                continue
+
+            start = 0
+            for batch, future in requests:
+                future.set_result(predictions[start:start + len(batch)])
+                start += len(batch)
@@ -1,58 +1,170 @@
+import time
+# measured before the heavy imports so the startup report includes them
+START_TIME = time.perf_counter()
+
+import os
+import sys
 import json
+import joblib
+import sqlite3
+import threading
 import plotly
 import pandas as pd
 import plotly.express as px
 
-from nltk.stem import WordNetLemmatizer
-from nltk.tokenize import word_tokenize
-
 from flask import Flask
 from flask import render_template, request, jsonify
 from plotly.graph_objs import Bar
-from sklearn.externals import joblib
-from sqlalchemy import create_engine
+
+sys.path.append('../models')
+from tokenizer import Tokenizer
+from batching import MicroBatcher
 
 
 app = Flask(__name__)
+tokenizer = Tokenizer()
 
 def tokenize(text):
-    ''' Tokenize textual data
-    
+    ''' Tokenize textual data the same way the classifier was trained
+
         params:
             text - a string
         returns:
              clean_tokens - clean tokens ready for TFIDF vectorizer
     '''
-    tokens = word_tokenize(text)
-    lemmatizer = WordNetLemmatizer()
+    return tokenizer(text)
 
-    clean_tokens = []
-    for tok in tokens:
-        clean_tok = lemmatizer.lemmatize(tok).lower().strip()
-        clean_tokens.append(clean_tok)
+# the data and the model are loaded on first use, not at import
+DATABASE_FILEPATH = '../data/message_categories.db'
+MODEL_FILEPATH = '../models/model.sav'
+resources = {}
+resources_lock = threading.Lock()
 
-    return clean_tokens
 
-# load data
-engine = create_engine('sqlite:///../data/message_categories.db')
-df = pd.read_sql_table('message_categories', engine)
+def load_once(name, load):
+    '''load a resource the first time it is asked for and report how long it took
 
-# load model
-model = joblib.load("../models/model.sav")
+       params:
+           name - the name to cache the resource under
+           load - a function that loads the resource
+       returns:
+           the loaded resource
+    '''
+    with resources_lock:
+        if name not in resources:
+            start = time.perf_counter()
+            resources[name] = load()
+            print('Loaded {} in {:.2f}s'.format(name, time.perf_counter() - start))
+        return resources[name]
+
+
+def get_model():
+    '''the classifier, with its numpy arrays memory-mapped read-only
+
+       The model is saved uncompressed by train_classifier.save_model, so the
+       arrays are mapped straight from the file. For the linear engine every
+       server worker then shares the same pages in the OS page cache instead
+       of holding its own copy. The forest engine does not benefit: sklearn's
+       Tree.__setstate__ copies the node arrays, so each worker still holds a
+       private copy of the trees.
+
+       The tokenizer step is set to n_jobs=1 (models saved before
+       train_classifier did so kept n_jobs=-1), so a large request never
+       forks a process pool from the server's threads.
+    '''
+    return load_once('model', lambda: joblib.load(MODEL_FILEPATH, mmap_mode='r')
+                                            .set_params(tokenize__n_jobs=1))
 
 
-# index webpage displays cool visuals and receives user input text for model
-@app.route('/')
-@app.route('/index')
-def index():
-    
+def load_category_names():
+    '''read the category column names without reading any rows
+    '''
+    connection = sqlite3.connect(DATABASE_FILEPATH)
+    try:
+        cursor = connection.execute('SELECT * FROM message_categories LIMIT 0')
+        return [column[0] for column in cursor.description][4:]
+    finally:
+        connection.close()
+
+
+def get_category_names():
+    '''the names of the categories, read from the table's columns
+    '''
+    return load_once('category names', load_category_names)
+
+
+def predict_messages(messages):
+    '''predict the category labels of a list of messages
+    '''
+    return get_model().predict(messages)
+
+
+# concurrent requests are predicted together, MAX_WAIT_MS=0 turns this off
+batcher = MicroBatcher(predict_messages,
+                       max_batch_size=int(os.environ.get('MAX_BATCH_SIZE', 64)),
+                       max_wait=float(os.environ.get('MAX_WAIT_MS', 5)) / 1000)
+# the most messages one /predict request may send
+MAX_MESSAGES = int(os.environ.get('MAX_MESSAGES', 1000))
+
+
+def database_version():
+    '''a cheap fingerprint of the database that changes whenever it is written
+
+       returns:
+           the modification times and sizes of the database and its WAL file
+    '''
+    return tuple((os.stat(path).st_mtime_ns, os.stat(path).st_size)
+                 for path in (DATABASE_FILEPATH, DATABASE_FILEPATH + '-wal')
+                 if os.path.exists(path))
+
+
+def load_summary(connection):
+    '''read the aggregates precomputed by the ETL
+
+       A database written before process_data.py stored them has no
+       message_summary table; the aggregates are then computed from the
+       message_categories table, as the app used to.
+
+       params:
+           connection - a sqlite3 connection to the database
+       returns:
+           summary - a dataframe of kind ('genre' or 'category'), name and value
+    '''
+    try:
+        return pd.read_sql('SELECT kind, name, value FROM message_summary ORDER BY rowid',
+                           connection)
+    except (sqlite3.OperationalError, pd.errors.DatabaseError):
+        print('No message_summary table in {}, computing the aggregates from the messages; '
+              'rerun process_data.py to precompute them'.format(DATABASE_FILEPATH))
+    genre_counts = connection.execute('SELECT genre, COUNT(message) FROM message_categories '
+                                      'GROUP BY genre ORDER BY genre').fetchall()
+    category_names = get_category_names()
+    category_counts = connection.execute('SELECT {} FROM message_categories'.format(
+        ', '.join('COALESCE(SUM("{}"), 0)'.format(name) for name in category_names))).fetchone()
+    return pd.DataFrame([('genre', genre, count) for genre, count in genre_counts] +
+                        [('category', name, count) for name, count in zip(category_names, category_counts)],
+                        columns=['kind', 'name', 'value'])
+
+
+def build_graphs():
+    '''build the dashboard graphs from the aggregates precomputed by the ETL
+
+       returns:
+           ids - the ids of the html elements for the graphs
+           graphJSON - the plotly graphs encoded in JSON
+    '''
+    connection = sqlite3.connect(DATABASE_FILEPATH)
+    try:
+        summary = load_summary(connection)
+    finally:
+        connection.close()
+
     # extract data needed for visuals
-    genre_counts = df.groupby('genre').count()['message']
-    genre_names = list(genre_counts.index)
-    response_class_df = df.loc[:, 'related':'direct_report'].sum().reset_index(name='frequency')
-    response_class_df.rename(columns={'index':'class'}, inplace=True)
+    agg_df = summary.loc[summary['kind'] == 'genre', ['name', 'value']]\
+                    .rename(columns={'name': 'names', 'value': 'counts'})
+    response_class_df = summary.loc[summary['kind'] == 'category', ['name', 'value']]\
+                               .rename(columns={'name': 'class', 'value': 'frequency'})
     # create visuals
-    agg_df = pd.DataFrame(data={'counts': genre_counts, 'names':genre_names})
     fig1 = px.bar(data_frame=agg_df, x='names', y='counts', title='Overview of Training Dataset')
     fig2 = px.bar(data_frame=response_class_df, x='class', y='frequency', title='Response Class Bar Graph')
     graphs = [fig1, fig2]
@@ -60,6 +172,30 @@ def index():
     # encode plotly graphs in JSON
     ids = ["graph-{}".format(i) for i, _ in enumerate(graphs)]
     graphJSON = json.dumps(graphs, cls=plotly.utils.PlotlyJSONEncoder)
+    return ids, graphJSON
+
+
+# the serialized graphs, rebuilt only when the database changes
+graph_cache = {'version': None}
+graph_cache_lock = threading.Lock()
+
+
+def cached_graphs():
+    '''return the serialized graphs, rebuilding them if the database changed
+    '''
+    version = database_version()
+    with graph_cache_lock:
+        if graph_cache['version'] != version:
+            graph_cache['ids'], graph_cache['graphJSON'] = build_graphs()
+            graph_cache['version'] = version
+        return graph_cache['ids'], graph_cache['graphJSON']
+
+
+# index webpage displays cool visuals and receives user input text for model
+@app.route('/')
+@app.route('/index')
+def index():
+    ids, graphJSON = cached_graphs()
     
     # render web page with plotly graphs
     return render_template('master.html', ids=ids, graphJSON=graphJSON)
@@ -72,8 +208,8 @@ def go():
     query = request.args.get('query', '') 
 
     # use model to predict classification for query
-    classification_labels = model.predict([query])[0]
-    classification_results = dict(zip(df.columns[4:], classification_labels))
+    classification_labels = batcher.submit([query])[0]
+    classification_results = dict(zip(get_category_names(), classification_labels))
 
     # This will render the go.html Please see that file. 
     return render_template(
@@ -83,8 +219,35 @@ def go():
     )
 
 
+# JSON API that classifies a list of messages
+@app.route('/predict', methods=['POST'])
+def predict():
+    '''classify the messages posted as {"messages": [...]}
+
+       returns:
+           {"predictions": [...]} with a dict of category labels per message,
+           or a 413 error for more than MAX_MESSAGES messages
+    '''
+    messages = (request.get_json(silent=True) or {}).get('messages')
+    if not isinstance(messages, list) or not all(isinstance(message, str) for message in messages):
+        return jsonify(error='expected a JSON body like {"messages": ["..."]}'), 400
+    if not messages:
+        return jsonify(predictions=[])
+    if len(messages) > MAX_MESSAGES:
+        return jsonify(error='at most {} messages can be classified per request'
+                       .format(MAX_MESSAGES)), 413
+
+    labels = batcher.submit(messages)
+    predictions = [dict(zip(get_category_names(), map(int, row))) for row in labels]
+    return jsonify(predictions=predictions)
+
+
+print('App ready in {:.2f}s, the data and model load on first use'
+      .format(time.perf_counter() - START_TIME))
+
+
 def main():
-    app.run(host='0.0.0.0', port=3001, debug=True)
+    app.run(host='0.0.0.0', port=3001, debug=True, threaded=True)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,77 @@
+import os
+import re
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data'))
+from process_data import clean_data
+
+CATEGORY_NAMES = [
+    'related', 'request', 'offer', 'aid_related', 'medical_help', 'medical_products',
+    'search_and_rescue', 'security', 'military', 'child_alone', 'water', 'food',
+    'shelter', 'clothing', 'money', 'missing_people', 'refugees', 'death', 'other_aid',
+    'infrastructure_related', 'transport', 'buildings', 'electricity', 'tools',
+    'hospitals', 'shops', 'aid_centers', 'other_infrastructure', 'weather_related',
+    'floods', 'storm', 'fire', 'earthquake', 'cold', 'other_weather', 'direct_report'
+]
+
+
+def clean_data_loop(df):
+    '''the original clean_data, which parses the categories column by column
+    '''
+    categories = df['categories'].str.split(';', expand=True)
+    row = categories.iloc[0]
+    category_colnames = row.apply(lambda x: re.findall(r'[a-z_A-Z]+', x)[0]).tolist()
+    categories.columns = category_colnames
+    for column in categories:
+        categories[column] = categories[column].str[-1]
+        categories[column] = categories[column].str.replace('2', '1')
+        categories[column] = categories[column].astype('int')
+    df.drop(columns=['categories'], inplace=True)
+    df = pd.concat([df, categories], axis=1)
+    df.drop_duplicates(inplace=True)
+    return df.copy(deep=True)
+
+
+def make_messages(n_rows, seed=42):
+    '''make a merged messages and categories dataframe with random labels
+    '''
+    rng = np.random.default_rng(seed)
+    labels = (rng.random((n_rows, len(CATEGORY_NAMES))) < .2).astype(int)
+    labels[:, 0] *= rng.choice([1, 2], size=n_rows, p=[.95, .05])
+    categories = pd.DataFrame(labels, columns=CATEGORY_NAMES).astype(str)
+    for name in CATEGORY_NAMES:
+        categories[name] = name + '-' + categories[name]
+    return pd.DataFrame({
+        'id': np.arange(n_rows),
+        'message': 'message ' + pd.Series(np.arange(n_rows)).astype(str),
+        'genre': rng.choice(['news', 'direct', 'social'], size=n_rows),
+        'categories': categories[CATEGORY_NAMES[0]].str.cat(categories[CATEGORY_NAMES[1:]], sep=';')
+    })
+
+
+def main():
+    '''time the vectorized and the column by column clean_data at 10k, 100k and 1M rows
+    '''
+    sizes = [int(size) for size in sys.argv[1:]] or [10000, 100000, 1000000]
+    print('{:>10} {:>12} {:>12} {:>8}'.format('rows', 'loop (s)', 'vector (s)', 'speedup'))
+    for n_rows in sizes:
+        df = make_messages(n_rows)
+
+        start = time.perf_counter()
+        expected = clean_data_loop(df.copy())
+        loop_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = clean_data(df.copy())
+        vector_time = time.perf_counter() - start
+
+        pd.testing.assert_frame_equal(result, expected)
+        print('{:>10,} {:>12.3f} {:>12.3f} {:>7.1f}x'
+              .format(n_rows, loop_time, vector_time, loop_time / vector_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+from sklearn.metrics import f1_score
+from sklearn.model_selection import train_test_split
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models'))
+from train_classifier import ENGINES, load_data, build_model, save_model
+
+
+def benchmark_engine(engine, X_train, X_test, Y_train, Y_test):
+    '''fit, time and score one engine of train_classifier.build_model
+
+       returns:
+           a dict with the fit time, predict latency, model size and F1 per category
+    '''
+    model = build_model(engine=engine)
+    start = time.perf_counter()
+    model.fit(X_train, Y_train)
+    fit_time = time.perf_counter() - start
+
+    Y_pred = model.predict(X_test)
+    message = X_test.iloc[0]
+    latencies = []
+    for _ in range(50):
+        start = time.perf_counter()
+        model.predict([message])
+        latencies.append(time.perf_counter() - start)
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        model_filepath = os.path.join(model_dir, 'model.sav')
+        save_model(model, model_filepath)
+        model_size = os.path.getsize(model_filepath)
+
+    f1 = [f1_score(Y_test.iloc[:, i], Y_pred[:, i], zero_division=0)
+          for i in range(Y_test.shape[1])]
+    return {'fit_time': fit_time, 'latency': np.median(latencies),
+            'size': model_size, 'f1': f1}
+
+
+def main():
+    '''compare fit time, predict latency, model size and per-category F1 of the engines
+    '''
+    if len(sys.argv) != 2:
+        print('Example: python bench_engines.py ../data/DisasterResponse.db')
+        return
+    X, Y, category_names = load_data(sys.argv[1])
+    X_train, X_test, Y_train, Y_test = train_test_split(X, Y, test_size=0.2, random_state=42)
+    results = {engine: benchmark_engine(engine, X_train, X_test, Y_train, Y_test)
+               for engine in ENGINES}
+
+    print('{:<24}'.format('') + ''.join('{:>12}'.format(engine) for engine in ENGINES))
+    print('{:<24}'.format('fit time (s)') +
+          ''.join('{:>12.1f}'.format(results[engine]['fit_time']) for engine in ENGINES))
+    print('{:<24}'.format('predict latency (ms)') +
+          ''.join('{:>12.1f}'.format(results[engine]['latency'] * 1000) for engine in ENGINES))
+    print('{:<24}'.format('model size (MB)') +
+          ''.join('{:>12.1f}'.format(results[engine]['size'] / 2**20) for engine in ENGINES))
+    print('{:<24}'.format('mean F1') +
+          ''.join('{:>12.3f}'.format(np.mean(results[engine]['f1'])) for engine in ENGINES))
+    print()
+    for i, name in enumerate(category_names):
+        print('{:<24}'.format(name) +
+              ''.join('{:>12.3f}'.format(results[engine]['f1'][i]) for engine in ENGINES))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+import os
+import sys
+import time
+import random
+import nltk
+import pandas as pd
+from sqlalchemy import create_engine
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models'))
+from tokenizer import Tokenizer, BatchTokenizer
+
+nltk.download('punkt')
+nltk.download('stopwords')
+nltk.download('wordnet')
+
+WORDS = ('water food shelter people need help the we are in and earthquake flood '
+         'storm houses destroyed children sick medical please send supplies '
+         'roads blocked hurricane victims trapped rain wind damaged hospitals').split()
+
+
+def load_messages(database_filepath=None, n_messages=20000):
+    '''load messages from the database, or make random ones when there is none
+
+       params:
+           database_filepath - path to the SQLite database written by process_data.py
+           n_messages - number of random messages to make without a database
+       returns:
+           messages - a list of strings
+    '''
+    if database_filepath:
+        engine = create_engine('sqlite:///' + database_filepath)
+        return pd.read_sql('SELECT message FROM message_categories', engine)['message'].tolist()
+    rng = random.Random(42)
+    return [' '.join(rng.choices(WORDS, k=rng.randint(5, 40))) for _ in range(n_messages)]
+
+
+def main():
+    '''report messages/sec for 1, 2, 4 and N tokenizer worker processes
+    '''
+    messages = load_messages(sys.argv[1] if len(sys.argv) > 1 else None)
+    workers = sorted({1, 2, 4, os.cpu_count()})
+    print('Tokenizing {} messages'.format(len(messages)))
+    print('{:>8} {:>10} {:>14}'.format('workers', 'seconds', 'messages/sec'))
+    for n_jobs in workers:
+        batch_tokenizer = BatchTokenizer(Tokenizer(), n_jobs=n_jobs)
+        start = time.perf_counter()
+        batch_tokenizer.transform(messages)
+        elapsed = time.perf_counter() - start
+        print('{:>8} {:>10.2f} {:>14,.0f}'.format(n_jobs, elapsed, len(messages) / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+import json
+import time
+import argparse
+import urllib.request
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+MESSAGES = [
+    'We need water and food, the earthquake destroyed our houses',
+    'Please send medical help, many people are sick after the flood',
+    'The storm blocked the roads and there is no electricity',
+    'Is the hospital open? My child is hurt',
+    'We are trapped on the roof, the water is rising',
+]
+
+
+def post(url, messages):
+    '''post one request to the /predict endpoint and time it
+
+       returns:
+           the latency in seconds
+    '''
+    body = json.dumps({'messages': messages}).encode()
+    request = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        response.read()
+    return time.perf_counter() - start
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Load test the /predict endpoint of app/run.py. Run it once '
+                    'against a server started with MAX_WAIT_MS=0 (no batching) and '
+                    'once against the default server to compare.')
+    parser.add_argument('--url', default='http://localhost:3001/predict')
+    parser.add_argument('--requests', type=int, default=2000, help='total number of requests')
+    parser.add_argument('--concurrency', type=int, default=32, help='number of concurrent clients')
+    parser.add_argument('--messages-per-request', type=int, default=1)
+    return parser.parse_args()
+
+
+def main():
+    '''report p50/p99 latency and throughput of the /predict endpoint
+    '''
+    args = parse_args()
+    payloads = [[MESSAGES[(i + j) % len(MESSAGES)] for j in range(args.messages_per_request)]
+                for i in range(args.requests)]
+    post(args.url, payloads[0])  # warm up
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        latencies = np.array(list(pool.map(lambda messages: post(args.url, messages), payloads)))
+    elapsed = time.perf_counter() - start
+
+    print('{} requests, {} concurrent, {} messages each'
+          .format(args.requests, args.concurrency, args.messages_per_request))
+    print('p50 latency:  {:8.1f} ms'.format(np.percentile(latencies, 50) * 1000))
+    print('p99 latency:  {:8.1f} ms'.format(np.percentile(latencies, 99) * 1000))
+    print('throughput:   {:8.1f} requests/sec, {:.1f} messages/sec'
+          .format(args.requests / elapsed, args.requests * args.messages_per_request / elapsed))
+
+
+if __name__ == '__main__':
+    main()
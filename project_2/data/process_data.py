@@ -1,7 +1,11 @@
-import sys
+import os
 import re
+import argparse
+import sqlite3
+import tempfile
+import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 
 
 def load_data(messages_filepath, categories_filepath):
@@ -22,7 +26,93 @@ def load_data(messages_filepath, categories_filepath):
     # merge datasets
     df = messages.merge(categories, on='id')
     return df
-    
+
+
+def load_data_chunks(messages_filepath, categories_filepath, chunksize):
+    '''stream the merged messages and categories datasets in chunks
+
+       Both datasets are copied, chunk by chunk, into a temporary SQLite
+       database and merged on 'id' there, so neither has to fit in memory.
+
+       params:
+           messages_filepath - a path the disaster message dataset
+           categories_filepath - a path to the disaster categories dataset
+           chunksize - the number of rows to read at a time
+       returns:
+           a generator of dataframes with at most chunksize merged rows
+    '''
+    with tempfile.TemporaryDirectory() as staging_dir:
+        engine = create_engine('sqlite:///' + os.path.join(staging_dir, 'staging.db'))
+        try:
+            for filepath, table_name in [(messages_filepath, 'messages'),
+                                         (categories_filepath, 'categories')]:
+                for chunk in pd.read_csv(filepath, chunksize=chunksize):
+                    chunk.to_sql(table_name, engine, index=False, if_exists='append')
+            with engine.begin() as connection:
+                connection.execute(text('CREATE INDEX ix_categories_id ON categories (id)'))
+
+            # same inner join, and row order, as messages.merge(categories, on='id')
+            query = ('SELECT messages.*, categories.categories FROM messages '
+                     'JOIN categories ON messages.id = categories.id '
+                     'ORDER BY messages.rowid, categories.rowid')
+            for chunk in pd.read_sql(query, engine, chunksize=chunksize):
+                yield chunk
+        finally:
+            engine.dispose()
+
+
+
+def parse_categories(categories):
+    '''parse every 'categories' string into a matrix of labels in one pass
+
+       Each string lists the same categories in the same order, e.g.
+       'related-1;request-0;...', with a single digit label per category, so
+       all of them have the same width. The strings are joined into one buffer
+       and viewed as a (rows, width) byte matrix; the labels are then just the
+       columns at the end of each field.
+
+       params:
+           categories - a Pandas.Series of 'name-label;name-label;...' strings
+       returns:
+           category_colnames - a list of the category names
+           labels - a uint8 numpy array with a row per string and a column per category
+       raises:
+           ValueError - if a row does not list the categories like the first row
+    '''
+    values = categories.tolist()
+    first = values[0]
+    width = len(first)
+
+    lengths = np.fromiter(map(len, values), dtype=np.int64, count=len(values))
+    mismatched = np.flatnonzero(lengths != width)
+    if mismatched.size:
+        raise ValueError('categories of row {} are not in the same order as the first row: {!r}'
+                         .format(categories.index[mismatched[0]], values[mismatched[0]]))
+
+    raw = np.frombuffer(bytearray(''.join(values).encode('ascii')), dtype=np.uint8)
+    raw = raw.reshape(len(values), width)
+
+    # the names come from the first row, the label is the last character of each field
+    fields = first.split(';')
+    category_colnames = [re.findall(r'[a-z_A-Z]+', field)[0] for field in fields]
+    label_positions = np.cumsum([len(field) + 1 for field in fields]) - 2
+
+    labels = raw[:, label_positions] - ord('0')
+    if (labels > 9).any():
+        row = np.flatnonzero((labels > 9).any(axis=1))[0]
+        raise ValueError('row {} has a non-numeric category label: {!r}'
+                         .format(categories.index[row], values[row]))
+
+    # with the labels blanked out every row must be byte for byte the first row
+    raw[:, label_positions] = raw[0, label_positions]
+    rows = raw.view('S{}'.format(width)).ravel()
+    mismatched = np.flatnonzero(rows != rows[0])
+    if mismatched.size:
+        raise ValueError('categories of row {} are not in the same order as the first row: {!r}'
+                         .format(categories.index[mismatched[0]], values[mismatched[0]]))
+
+    labels[labels == 2] = 1
+    return category_colnames, labels
 
 
 def clean_data(df):
@@ -34,25 +124,8 @@ def clean_data(df):
            df (copy) - a copy of the cleaned dataframe
     '''
     # create a dataframe of the 36 individual category columns
-    categories = df['categories'].str.split(';', expand=True)
-    
-    # select the first row of the categories dataframe
-    row = categories.iloc[0]
-    
-    # use this row to extract a list of new column names for categories.
-    # one way is to apply a lambda function that takes everything 
-    # up to the second to last character of each string with slicing
-    category_colnames = row.apply(lambda x: re.findall(r'[a-z_A-Z]+', x)[0]).tolist()
-    categories.columns = category_colnames
-    
-    for column in categories:
-        # set each value to be the last character of the string
-        categories[column] = categories[column].str[-1]
-        categories[column] = categories[column].str.replace('2', '1')
-    
-        # convert column from string to numeric
-        categories[column] = categories[column].astype('int')
-        
+    category_colnames, labels = parse_categories(df['categories'])
+    categories = pd.DataFrame(labels.astype('int'), columns=category_colnames, index=df.index)
         
     # drop the original categories column from `df`
     df.drop(columns=['categories'], inplace=True)
@@ -63,54 +136,260 @@ def clean_data(df):
     # drop duplicates
     df.drop_duplicates(inplace=True)
     return df.copy(deep=True)
-    
 
 
-def save_data(df, database_filename):
+def clean_data_chunks(chunks):
+    '''clean a stream of merged chunks and drop duplicates across all of them
+
+       Rows are deduplicated with a set of 64 bit row hashes instead of
+       keeping every row seen so far.
+
+       params:
+           chunks - an iterable of merged messages and categories dataframes
+       returns:
+           a generator of cleaned dataframes without duplicate rows
+    '''
+    seen = set()
+    for chunk in chunks:
+        chunk = clean_data(chunk)
+        # clean_data already dropped the duplicates within the chunk
+        hashes = pd.util.hash_pandas_object(chunk, index=False).tolist()
+        keep = [row_hash not in seen for row_hash in hashes]
+        seen.update(hashes)
+        yield chunk.loc[keep]
+
+
+
+TABLE_NAME = 'message_categories'
+SUMMARY_TABLE_NAME = 'message_summary'
+STAGING_TABLE_NAME = 'message_categories_staging'
+
+
+def connect_database(database_filename):
+    '''open a SQLite connection tuned for bulk writes
+
+       WAL lets the web app keep reading while the ETL writes, and
+       synchronous=NORMAL only syncs at checkpoints instead of every commit.
+
+       params:
+           database_filename - a path to the SQLite database
+       returns:
+           connection - a sqlite3 connection
+    '''
+    connection = sqlite3.connect(database_filename)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    return connection
+
+
+def create_table(connection, df, table_name, replace=True, temporary=False):
+    '''create a table with an explicit schema for the cleaned dataframe
+
+       Integer columns other than 'id' are the 0/1 category labels and are
+       declared SMALLINT (SQLite stores 0 and 1 without any payload bytes),
+       everything else is TEXT.
+
+       params:
+           connection - a sqlite3 connection
+           df - a cleaned dataframe, only its columns and dtypes are used
+           table_name - the name of the table
+           replace - drop an existing table first, otherwise keep it
+           temporary - create a TEMP table that is dropped with the connection
+    '''
+    columns = []
+    for name, dtype in df.dtypes.items():
+        if name == 'id':
+            columns.append('"id" INTEGER NOT NULL')
+        elif pd.api.types.is_integer_dtype(dtype):
+            columns.append('"{}" SMALLINT NOT NULL'.format(name))
+        else:
+            columns.append('"{}" TEXT'.format(name))
+
+    with connection:
+        if replace:
+            connection.execute('DROP TABLE IF EXISTS "{}"'.format(table_name))
+        connection.execute('CREATE {}TABLE IF NOT EXISTS "{}" ({})'
+                           .format('TEMP ' if temporary else '', table_name, ', '.join(columns)))
+
+
+def create_indexes(connection, table_name):
+    '''index the columns the app and the upserts look rows up by
+    '''
+    with connection:
+        for column in ['id', 'genre']:
+            connection.execute('CREATE INDEX IF NOT EXISTS "ix_{0}_{1}" ON "{0}" ("{1}")'
+                               .format(table_name, column))
+
+
+def insert_rows(connection, df, table_name, batch_size=50000):
+    '''bulk insert a dataframe with executemany, batch_size rows per transaction
+
+       params:
+           connection - a sqlite3 connection
+           df - a cleaned dataframe
+           table_name - the name of the table
+           batch_size - the number of rows inserted per transaction
+    '''
+    insert = 'INSERT INTO "{}" ({}) VALUES ({})'.format(
+        table_name, ', '.join('"{}"'.format(name) for name in df.columns),
+        ', '.join('?' * len(df.columns)))
+
+    for start in range(0, len(df), batch_size):
+        batch = df.iloc[start:start + batch_size]
+        # python scalars with None for missing values, which is what sqlite3 binds
+        values = [[None if pd.isna(value) else value for value in batch[name].tolist()]
+                  if batch[name].hasnans else batch[name].tolist()
+                  for name in batch.columns]
+        with connection:
+            connection.executemany(insert, zip(*values))
+
+
+def upsert_rows(connection, staging_table_name, table_name, columns):
+    '''replace the rows of table_name that have an id in the staging table
+       with the staging table's rows, in one transaction
+
+       'id' is not unique (a message can be listed with more than one set of
+       categories), so the incoming ids are deleted once for the whole load
+       before any of its rows are inserted; deleting per batch would remove
+       rows an earlier batch of the same load just inserted.
+
+       params:
+           connection - a sqlite3 connection
+           staging_table_name - the name of the table with the whole load
+           table_name - the name of the table to upsert into
+           columns - the names of the columns to copy
+    '''
+    columns = ', '.join('"{}"'.format(name) for name in columns)
+    with connection:
+        connection.execute('DELETE FROM "{0}" WHERE id IN (SELECT id FROM "{1}")'
+                           .format(table_name, staging_table_name))
+        connection.execute('INSERT INTO "{0}" ({2}) SELECT {2} FROM "{1}"'
+                           .format(table_name, staging_table_name, columns))
+
+
+def write_summary(connection, table_name, summary_table_name):
+    '''store the aggregates the web app plots in a small summary table
+
+       The message counts per genre and the number of messages in each
+       category are computed over the whole table, so they are also correct
+       after an append.
+
+       params:
+           connection - a sqlite3 connection
+           table_name - the name of the table with the cleaned messages
+           summary_table_name - the name of the table to store the aggregates in
+    '''
+    label_columns = [name for _, name, column_type, *_ in
+                     connection.execute('PRAGMA table_info("{}")'.format(table_name))
+                     if column_type == 'SMALLINT']
+    genre_counts = connection.execute(
+        'SELECT genre, COUNT(message) FROM "{}" GROUP BY genre ORDER BY genre'
+        .format(table_name)).fetchall()
+    category_counts = connection.execute('SELECT {} FROM "{}"'.format(
+        ', '.join('COALESCE(SUM("{}"), 0)'.format(name) for name in label_columns),
+        table_name)).fetchone()
+
+    with connection:
+        connection.execute('DROP TABLE IF EXISTS "{}"'.format(summary_table_name))
+        connection.execute('CREATE TABLE "{}" (kind TEXT NOT NULL, name TEXT, value INTEGER NOT NULL)'
+                           .format(summary_table_name))
+        connection.executemany('INSERT INTO "{}" VALUES (?, ?, ?)'.format(summary_table_name),
+                               [('genre', genre, count) for genre, count in genre_counts] +
+                               [('category', name, count)
+                                for name, count in zip(label_columns, category_counts)])
+
+
+def save_data(df, database_filename, if_exists='replace'):
     '''save the dataframe to a SQLite database
 
        params:
            df - a dataframe
            database_filename - a path to where you want df saved
+           if_exists - 'replace' rebuilds the table, 'append' upserts the rows by 'id'
     '''
-    # Define database file name
-    path = 'sqlite:///' + database_filename
-    
-    # create a SQLAlchemy engine to the database
-    engine = create_engine(path)
-    #table_name = database_filename.strip('.db')
-    table_name = 'message_categories'
-    # save the database
-    df.to_sql(table_name, engine, index=False, if_exists='replace')
-    pass  
+    save_data_chunks([df], database_filename, if_exists=if_exists)
+
+
+def save_data_chunks(chunks, database_filename, if_exists='replace', batch_size=50000):
+    '''save a stream of dataframes to a SQLite database
+
+       When appending, the chunks are first loaded into a temporary staging
+       table and then upserted into the table by 'id' all at once.
+
+       params:
+           chunks - an iterable of cleaned dataframes
+           database_filename - a path to where you want the data saved
+           if_exists - 'replace' rebuilds the table, 'append' upserts the rows by 'id'
+           batch_size - the number of rows inserted per transaction
+    '''
+    append = if_exists == 'append'
+    connection = connect_database(database_filename)
+    try:
+        columns = None
+        for chunk in chunks:
+            if columns is None:
+                columns = list(chunk.columns)
+                create_table(connection, chunk, TABLE_NAME, replace=not append)
+                if append:
+                    create_table(connection, chunk, STAGING_TABLE_NAME, temporary=True)
+            insert_rows(connection, chunk, STAGING_TABLE_NAME if append else TABLE_NAME,
+                        batch_size=batch_size)
+        if columns is None:
+            # nothing to save, leave the database as it is
+            return
+        if append:
+            upsert_rows(connection, STAGING_TABLE_NAME, TABLE_NAME, columns)
+        # building the indexes once after a full load is faster than maintaining them
+        create_indexes(connection, TABLE_NAME)
+        write_summary(connection, TABLE_NAME, SUMMARY_TABLE_NAME)
+    finally:
+        connection.close()
+
+
+def parse_args():
+    '''parse the command line arguments
+    '''
+    parser = argparse.ArgumentParser(
+        description='Clean the disaster messages and categories datasets and '
+                    'save them to a SQLite database.',
+        epilog='Example: python process_data.py disaster_messages.csv '
+               'disaster_categories.csv DisasterResponse.db')
+    parser.add_argument('messages_filepath', help='the disaster messages CSV')
+    parser.add_argument('categories_filepath', help='the disaster categories CSV')
+    parser.add_argument('database_filepath', help='the SQLite database to save the cleaned data to')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='stream the data through the ETL this many rows at a '
+                             'time instead of loading it all into memory')
+    parser.add_argument('--append', action='store_true',
+                        help='upsert the rows by id into the existing table '
+                             'instead of rebuilding it')
+    return parser.parse_args()
 
 
 def main():
     '''the driver function
     '''
-    if len(sys.argv) == 4:
+    args = parse_args()
+    if_exists = 'append' if args.append else 'replace'
 
-        messages_filepath, categories_filepath, database_filepath = sys.argv[1:]
-
-        print('Loading data...\n    MESSAGES: {}\n    CATEGORIES: {}'
-              .format(messages_filepath, categories_filepath))
-        df = load_data(messages_filepath, categories_filepath)
+    print('Loading data...\n    MESSAGES: {}\n    CATEGORIES: {}'
+          .format(args.messages_filepath, args.categories_filepath))
+    if args.chunksize:
+        print('Cleaning and saving data in chunks of {} rows...\n    DATABASE: {}'
+              .format(args.chunksize, args.database_filepath))
+        chunks = load_data_chunks(args.messages_filepath, args.categories_filepath,
+                                  args.chunksize)
+        save_data_chunks(clean_data_chunks(chunks), args.database_filepath, if_exists=if_exists)
+    else:
+        df = load_data(args.messages_filepath, args.categories_filepath)
 
         print('Cleaning data...')
         df = clean_data(df)
-        
-        print('Saving data...\n    DATABASE: {}'.format(database_filepath))
-        save_data(df, database_filepath)
-        
-        print('Cleaned data saved to database!')
-    
-    else:
-        print('Please provide the filepaths of the messages and categories '\
-              'datasets as the first and second argument respectively, as '\
-              'well as the filepath of the database to save the cleaned data '\
-              'to as the third argument. \n\nExample: python process_data.py '\
-              'disaster_messages.csv disaster_categories.csv '\
-              'DisasterResponse.db')
+
+        print('Saving data...\n    DATABASE: {}'.format(args.database_filepath))
+        save_data(df, args.database_filepath, if_exists=if_exists)
+
+    print('Cleaned data saved to database!')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,99 @@
+import numpy as np
+from scipy import sparse
+from scipy.optimize import minimize
+from sklearn.base import BaseEstimator, ClassifierMixin
+
+
+def _loss_and_gradient(w, X, X_T, Y, alpha, scale):
+    '''the mean logistic loss of every label with an L2 penalty, and its gradient
+
+       The weights are fitted as W = scale * U, with each feature's column
+       of X already multiplied by its scale, which conditions the problem
+       much better for L-BFGS without moving its minimum.
+
+       params:
+           w - the (features, labels) weights U, raveled, then the intercept of each label
+           X - a (samples, features) sparse matrix with scaled columns
+           X_T - X transposed, in CSR format
+           Y - a (samples, labels) array of 0/1 labels
+           alpha - the L2 regularization strength
+           scale - a (features, 1) array of the scale of each feature
+       returns:
+           loss - the loss summed over the labels
+           gradient - its gradient with respect to w
+    '''
+    n_samples, n_labels = Y.shape
+    U = w[:-n_labels].reshape(-1, n_labels)
+    Z = X @ U + w[-n_labels:]
+    # log(1 + exp(z)) and the sigmoid of z from one exp(-|z|)
+    E = np.exp(-np.abs(Z))
+    penalty = scale**2 * U
+    loss = ((np.maximum(Z, 0) + np.log1p(E) - Y * Z).sum() / n_samples
+            + alpha / 2 * np.dot(penalty.ravel(), U.ravel()))
+    residuals = (np.where(Z >= 0, 1, E) / (1 + E) - Y) / n_samples
+    gradient = np.concatenate([(X_T @ residuals + alpha * penalty).ravel(), residuals.sum(axis=0)])
+    return loss, gradient
+
+
+class MultiLabelLogisticRegression(BaseEstimator, ClassifierMixin):
+    '''L2 logistic regression of every 0/1 label at once
+
+       All labels share one (features, labels) weight matrix, fitted with
+       L-BFGS on the sum of their losses, so each iteration is one sparse
+       matrix product for every label instead of a separate fit per label.
+       Only the features that occur in the training data are fitted, each
+       scaled by the inverse root of its mean square plus alpha (a diagonal
+       preconditioner), and the intercepts start at each label's log odds.
+       The coefficients are kept as one sparse (features, labels) matrix, so
+       predicting all labels is a single sparse matrix product and the saved
+       model stays small with hashed features.
+
+       params:
+           alpha - the L2 regularization strength (of the mean loss, as in SGDClassifier)
+           max_iter - the maximum number of L-BFGS iterations
+           tol - L-BFGS stops when no gradient entry is larger than tol
+    '''
+    def __init__(self, alpha=1e-4, max_iter=500, tol=1e-4):
+        self.alpha = alpha
+        self.max_iter = max_iter
+        self.tol = tol
+
+    def fit(self, X, Y):
+        '''fit the logistic regressions of every column of Y together
+
+           params:
+               X - a sparse matrix of features
+               Y - a (samples, labels) array or dataframe of 0/1 labels
+        '''
+        X = sparse.csr_matrix(X, dtype=np.float64)
+        Y = np.asarray(Y, dtype=np.float64)
+        n_samples, n_labels = Y.shape
+        used = np.flatnonzero(X.getnnz(axis=0))
+        X_used = X[:, used]
+        scale = 1 / np.sqrt(np.asarray(X_used.multiply(X_used).sum(axis=0)).ravel() / n_samples + self.alpha)
+        X_used = (X_used @ sparse.diags(scale)).tocsr()
+
+        w = np.zeros(len(used) * n_labels + n_labels)
+        rate = np.clip(Y.mean(axis=0), 1 / (n_samples + 1), n_samples / (n_samples + 1))
+        w[-n_labels:] = np.log(rate / (1 - rate))
+        result = minimize(_loss_and_gradient, w, jac=True, method='L-BFGS-B',
+                          args=(X_used, X_used.T.tocsr(), Y, self.alpha, scale[:, None]),
+                          options={'maxiter': self.max_iter, 'gtol': self.tol})
+        W = scale[:, None] * result.x[:-n_labels].reshape(len(used), n_labels)
+        rows = np.repeat(used, n_labels)
+        cols = np.tile(np.arange(n_labels), len(used))
+        self.coef_ = sparse.csr_matrix((W.ravel(), (rows, cols)), shape=(X.shape[1], n_labels))
+        self.intercept_ = result.x[-n_labels:]
+        self.n_iter_ = result.nit
+        return self
+
+    def decision_function(self, X):
+        return (X @ self.coef_).toarray() + self.intercept_
+
+    def predict(self, X):
+        '''predict the 0/1 labels of every sample
+
+           returns:
+               a (samples, labels) integer array
+        '''
+        return (self.decision_function(X) > 0).astype(int)
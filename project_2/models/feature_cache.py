@@ -0,0 +1,92 @@
+import os
+import time
+import shutil
+import inspect
+import joblib
+
+
+class FeatureCache:
+    '''On-disk cache of fitted transformer output for Pipeline(memory=...)
+
+       Implements the cache() interface of joblib.Memory, which is all
+       sklearn's Pipeline needs. Each call is keyed by a hash of its arguments,
+       i.e. the unfitted transformer's params and the fold's data, so every
+       CV fold's vectorizer/TFIDF output is computed once and then loaded by
+       all other grid search candidates for that fold. Hits and misses are
+       appended to a log in the cache directory so calls made in parallel
+       worker processes are counted too.
+
+       params:
+           location - directory to keep the cached results in
+    '''
+    def __init__(self, location):
+        self.location = location
+
+    def cache(self, func, ignore=None):
+        '''wrap func so its results are stored in and loaded from the cache
+
+           params:
+               func - the function to cache
+               ignore - names of arguments to leave out of the cache key
+           returns:
+               cached_func - a function with the same signature as func
+        '''
+        signature = inspect.signature(func)
+        ignore = set(ignore or ())
+
+        def cached_func(*args, **kwargs):
+            arguments = signature.bind(*args, **kwargs).arguments
+            key = joblib.hash((func.__module__, func.__qualname__,
+                               {name: value for name, value in arguments.items()
+                                if name not in ignore}))
+            path = os.path.join(self.location, key + '.pkl')
+            start = time.perf_counter()
+            if os.path.exists(path):
+                output, duration = joblib.load(path)
+                self._log('hit', duration - (time.perf_counter() - start))
+                return output
+
+            output = func(*args, **kwargs)
+            duration = time.perf_counter() - start
+            os.makedirs(self.location, exist_ok=True)
+            # write to a temporary file first so parallel readers never see half a file
+            tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+            joblib.dump((output, duration), tmp_path)
+            os.replace(tmp_path, path)
+            self._log('miss', duration)
+            return output
+        return cached_func
+
+    def _log(self, event, seconds):
+        with open(os.path.join(self.location, 'stats.log'), 'a') as log:
+            log.write('{} {:.6f}\n'.format(event, seconds))
+
+    def report(self):
+        '''summarize how much the cache was used
+
+           returns:
+               a dict with the number of hits and misses, the seconds saved
+               by the hits and the size of the cache on disk in bytes
+        '''
+        hits, misses, seconds_saved = 0, 0, 0.
+        log_path = os.path.join(self.location, 'stats.log')
+        if os.path.exists(log_path):
+            with open(log_path) as log:
+                for line in log:
+                    event, seconds = line.split()
+                    if event == 'hit':
+                        hits += 1
+                        seconds_saved += float(seconds)
+                    else:
+                        misses += 1
+
+        size = 0
+        for root, _, files in os.walk(self.location):
+            size += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+        return {'hits': hits, 'misses': misses,
+                'seconds_saved': seconds_saved, 'size_bytes': size}
+
+    def clear(self):
+        '''delete the cache directory and everything in it
+        '''
+        shutil.rmtree(self.location, ignore_errors=True)
@@ -0,0 +1,134 @@
+import os
+import re
+from functools import lru_cache
+from multiprocessing import Pool
+from nltk.tokenize import word_tokenize
+from nltk.stem import WordNetLemmatizer
+from nltk.corpus import stopwords
+from sklearn.base import BaseEstimator, TransformerMixin
+
+
+NON_ALPHANUMERIC = re.compile(r'[^a-zA-Z0-9]')
+
+
+class Tokenizer:
+    '''Tokenize disaster messages for the TFIDF vectorizers
+
+       Stopwords are loaded once into a frozenset and lemmas are kept in a
+       bounded LRU cache keyed by (token, pos), so repeated words are only
+       lemmatized the first time they are seen. The text is lowercased
+       first, as the original CountVectorizer did before calling
+       train_classifier.tokenize, so the tokens are exactly the same.
+
+       params:
+           cache_size - maximum number of (token, pos) lemmas to keep
+    '''
+    def __init__(self, cache_size=2**16):
+        self.cache_size = cache_size
+        self._setup()
+
+    def _setup(self):
+        '''load the stopwords and build a fresh lemma cache
+        '''
+        self.stop_words = frozenset(stopwords.words('english'))
+        self._lemmatize = lru_cache(maxsize=self.cache_size)(WordNetLemmatizer().lemmatize)
+
+    def __call__(self, text):
+        '''Tokenize data to be used in TFIDF vectorizers
+
+           params:
+               text - a string to be tokenized
+           returns:
+               clean_tokens - tokens from text ready for TFIDF vectorizers
+        '''
+        text = NON_ALPHANUMERIC.sub(' ', text.lower())
+        clean_tokens = list()
+        for token in word_tokenize(text):
+            if token in self.stop_words:
+                continue
+            token = self._lemmatize(token, 'v').lower().strip()
+            clean_tokens.append(self._lemmatize(token, 'n').lower().strip())
+        return clean_tokens
+
+    def cache_info(self):
+        '''hit/miss statistics of the lemma cache
+
+           returns:
+               a dict with the hits, misses, current size and maximum size
+        '''
+        info = self._lemmatize.cache_info()
+        return {'hits': info.hits, 'misses': info.misses,
+                'size': info.currsize, 'maxsize': info.maxsize}
+
+    def cache_clear(self):
+        '''empty the lemma cache and reset its statistics
+        '''
+        self._lemmatize.cache_clear()
+
+    def __getstate__(self):
+        # the cache and NLTK objects are rebuilt on load instead of pickled
+        return {'cache_size': self.cache_size}
+
+    def __setstate__(self, state):
+        self.cache_size = state['cache_size']
+        self._setup()
+
+
+def passthrough(tokens):
+    '''analyzer for vectorizers fed with already tokenized messages
+    '''
+    return tokens
+
+
+# each pool worker keeps its own tokenizer (and lemma cache) for all chunks
+_worker_tokenizer = None
+
+
+def _init_worker(tokenizer):
+    global _worker_tokenizer
+    _worker_tokenizer = tokenizer
+
+
+def _tokenize_chunk(texts):
+    return [_worker_tokenizer(text) for text in texts]
+
+
+class BatchTokenizer(BaseEstimator, TransformerMixin):
+    '''Tokenize a whole corpus up front, in chunks, across a process pool
+
+       Used as the first step of a pipeline so the vectorizer (with
+       analyzer=passthrough) and everything after it work on cached token
+       lists instead of re-tokenizing the raw messages.
+
+       params:
+           tokenizer - a Tokenizer, a fresh one is made when None
+           n_jobs - number of worker processes, -1 uses every core
+           chunksize - number of messages sent to a worker at a time
+    '''
+    def __init__(self, tokenizer=None, n_jobs=1, chunksize=500):
+        self.tokenizer = tokenizer
+        self.n_jobs = n_jobs
+        self.chunksize = chunksize
+
+    def fit(self, X, y=None):
+        return self
+
+    def transform(self, X, y=None):
+        '''tokenize every message in X
+
+           params:
+               X - an iterable of strings
+           returns:
+               a list with the list of tokens of each message
+        '''
+        tokenizer = self.tokenizer if self.tokenizer is not None else Tokenizer()
+        texts = list(X)
+        n_jobs = os.cpu_count() if self.n_jobs == -1 else self.n_jobs
+
+        # a pool is not worth starting for a handful of messages (e.g. one query)
+        if n_jobs == 1 or len(texts) <= self.chunksize:
+            return [tokenizer(text) for text in texts]
+
+        chunks = [texts[i:i + self.chunksize] for i in range(0, len(texts), self.chunksize)]
+        with Pool(n_jobs, initializer=_init_worker, initargs=(tokenizer,)) as pool:
+            return [tokens for chunk in pool.imap(_tokenize_chunk, chunks) for tokens in chunk]
@@ -1,25 +1,26 @@
-import sys
-import re
-import pickle
+import argparse
+import tempfile
 import nltk
+import joblib
 import pandas as pd
-from nltk.tokenize import word_tokenize
-from nltk.stem import WordNetLemmatizer
-from nltk.corpus import stopwords
 from sqlalchemy import create_engine
 from sklearn.model_selection import train_test_split, GridSearchCV
-from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer
+from sklearn.feature_extraction.text import CountVectorizer, HashingVectorizer, TfidfTransformer
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.pipeline import Pipeline, FeatureUnion
 from sklearn.multioutput import MultiOutputClassifier
 from sklearn.metrics import classification_report
 from sklearn.neighbors import KNeighborsClassifier
+from tokenizer import Tokenizer, BatchTokenizer, passthrough
+from feature_cache import FeatureCache
+from estimators import MultiLabelLogisticRegression
 
 nltk.download('punkt')
 nltk.download('stopwords')
 nltk.download('wordnet')
 nltk.download('averaged_perceptron_tagger')
-lemmatizer = WordNetLemmatizer()
+tokenizer = Tokenizer()
+ENGINES = ('forest', 'linear')
 
 def load_data(database_filepath):
     '''loads the data from the database
@@ -47,34 +48,60 @@ def tokenize(text):
        returns:
            clean_tokens -  tokens from text ready for TFIDF vectorizers
     '''
-    text = re.sub(r'[^a-zA-Z0-9]', ' ', text)
-    clean_tokens = list()
-    tokens = word_tokenize(text)
-    
-    removed_stopwords = [token for token in tokens if token not in stopwords.words('english')]
-    
-    clean_tokens = [lemmatizer.lemmatize(word, pos='v').lower().strip() for word in removed_stopwords]
-    clean_tokens = [lemmatizer.lemmatize(token, pos='n').lower().strip() for token in clean_tokens]
-    return clean_tokens
+    return tokenizer(text)
 
-def build_model():
+def build_model(n_jobs=-1, memory=None, engine='forest'):
     
     '''Build the machine learning model using grid search
     
        Only one parameter is varied to reduce the time needed for training.
+       The messages are tokenized once, across n_jobs processes, before the
+       grid search so every fold and parameter value reuses the same tokens.
+       When memory is given, each fold's TFIDF features are fitted once and
+       shared by every candidate instead of being refit per candidate; the
+       candidates are then searched one at a time, since candidates fitted
+       in parallel would all miss the cache for the same fold together.
+
+       params:
+           n_jobs - number of processes used to tokenize the messages
+           memory - a FeatureCache (or joblib.Memory) for the fitted features,
+                    which runs the grid search in a single process
+           engine - 'forest' fits a random forest per category on TFIDF
+                    features, 'linear' fits an L2 logistic regression of
+                    every category at once, with one weight matrix, on one
+                    hashed TFIDF matrix, which needs no vocabulary in memory
+                    and predicts every category with a single sparse matrix
+                    product
     '''
-    pipeline = Pipeline([
-        ('vect', CountVectorizer(tokenizer=tokenize)),
-        ('tfidf_trans', TfidfTransformer()),
-        ('clf', MultiOutputClassifier(RandomForestClassifier(n_estimators=5)))
-    ])
-    
-    parameters = {
-    'clf__estimator__min_samples_split':[2, 5, 10]
-    }
+    if engine == 'forest':
+        pipeline = Pipeline([
+            ('vect', CountVectorizer(analyzer=passthrough)),
+            ('tfidf_trans', TfidfTransformer()),
+            ('clf', MultiOutputClassifier(RandomForestClassifier(n_estimators=5)))
+        ], memory=memory)
+
+        parameters = {
+        'clf__estimator__min_samples_split':[2, 5, 10]
+        }
+    elif engine == 'linear':
+        pipeline = Pipeline([
+            ('vect', HashingVectorizer(analyzer=passthrough, n_features=2**18,
+                                       alternate_sign=False, norm=None)),
+            ('tfidf_trans', TfidfTransformer()),
+            ('clf', MultiLabelLogisticRegression())
+        ], memory=memory)
+
+        parameters = {
+        'clf__alpha':[1e-5, 1e-4, 1e-3]
+        }
+    else:
+        raise ValueError('engine must be one of {}, got {!r}'.format(ENGINES, engine))
 
-    cv = GridSearchCV(pipeline, param_grid=parameters, cv=5, n_jobs=-1)
-    return cv
+    cv = GridSearchCV(pipeline, param_grid=parameters, cv=5, n_jobs=-1 if memory is None else 1)
+    return Pipeline([
+        ('tokenize', BatchTokenizer(tokenizer, n_jobs=n_jobs)),
+        ('search', cv)
+    ])
 
 
 def evaluate_model(model, X_test, Y_test, category_names=None):
@@ -87,39 +114,66 @@ def evaluate_model(model, X_test, Y_test, category_names=None):
 
 
 def save_model(model, model_filepath):
-    '''Save the model as a .pkl file
+    '''Save the model as an uncompressed joblib file
+
+       The numpy arrays are written as raw buffers so app/run.py can load
+       them with joblib.load(mmap_mode='r'); the linear engine's arrays are then
+       shared between workers (the forests' tree arrays are copied on load).
     '''
-    pickle.dump(model, open(model_filepath, 'wb'))
+    joblib.dump(model, model_filepath, compress=0)
+
+
+def parse_args():
+    '''parse the command line arguments
+    '''
+    parser = argparse.ArgumentParser(
+        description='Train the disaster message classifier and save it.',
+        epilog='Example: python train_classifier.py ../data/DisasterResponse.db classifier.pkl')
+    parser.add_argument('database_filepath', help='the disaster messages database')
+    parser.add_argument('model_filepath', help='the file to save the trained model to')
+    parser.add_argument('--engine', choices=ENGINES, default='forest',
+                        help="'forest' (default) or the faster, smaller 'linear' model")
+    parser.add_argument('--feature-cache', action='store_true',
+                        help="fit each fold's TFIDF features once and share them between "
+                             'the grid search candidates, searching in a single process')
+    return parser.parse_args()
 
 
 def main():
     '''the drive function
     '''
-    if len(sys.argv) == 3:
-        database_filepath, model_filepath = sys.argv[1:]
-        print('Loading data...\n    DATABASE: {}'.format(database_filepath))
-        X, Y, category_names = load_data(database_filepath)
-        X_train, X_test, Y_train, Y_test = train_test_split(X, Y, test_size=0.2)
-        
-        print('Building model...')
-        model = build_model()
-        
-        print('Training model...')
-        model.fit(X_train, Y_train)
-        
-        print('Evaluating model...')
-        evaluate_model(model, X_test, Y_test, category_names)
-
-        print('Saving model...\n    MODEL: {}'.format(model_filepath))
-        save_model(model, model_filepath)
-
-        print('Trained model saved!')
+    args = parse_args()
+    database_filepath, model_filepath = args.database_filepath, args.model_filepath
+    print('Loading data...\n    DATABASE: {}'.format(database_filepath))
+    X, Y, category_names = load_data(database_filepath)
+    X_train, X_test, Y_train, Y_test = train_test_split(X, Y, test_size=0.2)
+    
+    print('Building model...\n    ENGINE: {}'.format(args.engine))
+    feature_cache = None
+    if args.feature_cache:
+        feature_cache = FeatureCache(tempfile.mkdtemp(prefix='feature_cache_'))
+    model = build_model(memory=feature_cache, engine=args.engine)
+    
+    print('Training model...')
+    model.fit(X_train, Y_train)
+    if feature_cache is not None:
+        report = feature_cache.report()
+        print('    FEATURE CACHE: {} hits, {} misses, {:.1f}s saved, {:.1f} MB on disk'
+              .format(report['hits'], report['misses'], report['seconds_saved'],
+                      report['size_bytes'] / 2**20))
+        feature_cache.clear()
+        model.named_steps['search'].best_estimator_.set_params(memory=None)
+    
+    print('Evaluating model...')
+    evaluate_model(model, X_test, Y_test, category_names)
 
-    else:
-        print('Please provide the filepath of the disaster messages database '\
-              'as the first argument and the filepath of the pickle file to '\
-              'save the model to as the second argument. \n\nExample: python '\
-              'train_classifier.py ../data/DisasterResponse.db classifier.pkl')
+    print('Saving model...\n    MODEL: {}'.format(model_filepath))
+    # the served model tokenizes in its own process, a pool per request
+    # would be forked from the web app's threads
+    model.set_params(tokenize__n_jobs=1)
+    save_model(model, model_filepath)
+
+    print('Trained model saved!')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from recommender.index import SimilarityIndex
+from recommender.neighbors import UserNeighbors
+from bench_user_item import NOTEBOOK_SIZE, make_interactions
+
+SIZES = [NOTEBOOK_SIZE, (50000, 5000, 500000)]
+K = 20
+N_UPDATES = 5
+UPDATE_ROWS = 1000
+
+
+def per_call(function, args):
+    '''the mean seconds of function(arg) over args'''
+    start = time.perf_counter()
+    for arg in args:
+        function(arg)
+    return (time.perf_counter() - start) / len(args)
+
+
+def main():
+    '''build an index, add interactions in chunks and compare with rebuilding it
+    and with scanning the matrix for every query
+    '''
+    print('{:>18} {:>10} {:>11} {:>14} {:>12} {:>12} {:>12} {:>7}'
+          .format('users x articles', 'build (s)', 'update (s)', 'users updated', 'scan (ms)',
+                  'lookup (us)', 'recs (us)', 'exact'))
+    for size in SIZES:
+        df = make_interactions(*size, seed=size[0]).sample(frac=1, random_state=0).reset_index(drop=True)
+        n_rows = len(df) - N_UPDATES * UPDATE_ROWS
+        with tempfile.TemporaryDirectory() as directory:
+            start = time.perf_counter()
+            index = SimilarityIndex.build(df[:n_rows], os.path.join(directory, 'index'), k=K)
+            build_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            updated = []
+            for chunk in range(N_UPDATES):
+                rows = df[n_rows + chunk * UPDATE_ROWS:n_rows + (chunk + 1) * UPDATE_ROWS]
+                (rescored, merged), _ = index.update(rows)
+                updated.append(rescored + merged)
+            update_time = (time.perf_counter() - start) / N_UPDATES
+
+            # queries served from the index against a scan of the whole matrix
+            users = index.user_index[::max(1, len(index.user_index) // 2000)]
+            neighbors = UserNeighbors.from_interactions(df)
+            scan = per_call(lambda user_id: neighbors.find_similar_users(user_id, K), users[:50])
+            lookup = per_call(index.similar_users, users)
+            recs = per_call(index.recommend, users)
+
+            rebuilt = SimilarityIndex.build(df, os.path.join(directory, 'rebuilt'), k=K)
+            exact = all(index.similar_users(user_id) == rebuilt.similar_users(user_id)
+                        and index.recommend(user_id) == rebuilt.recommend(user_id) for user_id in users)
+            print('{:>18} {:>10.2f} {:>11.2f} {:>14,.0f} {:>12.2f} {:>12.1f} {:>12.1f} {:>7}'
+                  .format('{:,} x {:,}'.format(len(index.user_index), len(index.article_index)), build_time,
+                          update_time, np.mean(updated), 1000 * scan, 10**6 * lookup, 10**6 * recs, str(exact)))
+
+
+if __name__ == '__main__':
+    main()
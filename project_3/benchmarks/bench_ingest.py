@@ -0,0 +1,107 @@
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from recommender.ingest import InteractionLog
+from bench_user_item import NOTEBOOK_SIZE, make_interactions
+
+SIZES = [NOTEBOOK_SIZE, (200000, 10000, 2000000)]
+
+
+def make_log(n_users, n_articles, n_interactions, seed):
+    '''make a user-item-interactions.csv like frame, with hashed emails and a
+    few missing ones'''
+    df = make_interactions(n_users, n_articles, n_interactions, seed)
+    emails = pd.Series(['{:040x}'.format(user_id * 2654435761 % 2**160) for user_id in df['user_id']],
+                       dtype='object')
+    emails[np.random.default_rng(seed).random(len(df)) < .0005] = np.nan
+    return pd.DataFrame({'article_id': df['article_id'], 'title': df['title'], 'email': emails})
+
+
+def legacy_email_mapper(df):
+    '''the notebook's email_mapper'''
+    coded_dict = dict()
+    cter = 1
+    email_encoded = []
+    for val in df['email']:
+        if val not in coded_dict:
+            coded_dict[val] = cter
+            cter += 1
+        email_encoded.append(coded_dict[val])
+    return email_encoded
+
+
+def legacy_get_top_article_ids(n, df):
+    '''the notebook's get_top_article_ids'''
+    article_num_inter = df.groupby('article_id').count().reset_index().drop(columns='title')
+    top_articles = article_num_inter.sort_values(by='user_id', ascending=False)['article_id']
+    return top_articles[:n]
+
+
+def legacy_get_top_articles(n, df):
+    '''the notebook's get_top_articles'''
+    top_article_ids = legacy_get_top_article_ids(n, df)
+    return list(set(df[df['article_id'].isin(top_article_ids)]['title']))
+
+
+def legacy_get_article_names(article_ids, df):
+    '''the notebook's get_article_names'''
+    filter_for_article = df['article_id'].isin(article_ids)
+    return list(df[filter_for_article]['title'].unique().tolist())
+
+
+def per_call(function, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    '''time the notebook's ingest and popularity helpers against the InteractionLog tables
+    '''
+    print('{:>12} {:>16} {:>16} {:>16} {:>18} {:>18} {:>8}'
+          .format('interactions', 'email_mapper (s)', 'ingest (s)', 'top 10 (ms)', 'top titles (ms)',
+                  'names (ms)', 'same'))
+    for size in SIZES:
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, 'user-item-interactions.csv')
+            make_log(*size, seed=size[0]).to_csv(filepath)
+            log, df = InteractionLog.read_csv(filepath, chunksize=250000)
+            raw = pd.read_csv(filepath, usecols=['article_id', 'title', 'email'])
+
+        # the ids and tables of the parsed csv, a chunk at a time
+        chunks = [raw[start:start + 250000] for start in range(0, len(raw), 250000)]
+        start = time.perf_counter()
+        ingest = InteractionLog()
+        for chunk in chunks:
+            ingest.add(chunk)
+        ingest_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        email_encoded = legacy_email_mapper(raw)
+        mapper_time = time.perf_counter() - start
+        legacy_df = raw.drop(columns='email').assign(user_id=email_encoded)
+
+        ids = log.get_top_article_ids(10)
+        same = ((df['user_id'].to_numpy() == np.array(email_encoded)).all()
+                and set(legacy_get_top_articles(10, legacy_df)) == set(log.get_top_articles(10))
+                and set(legacy_get_article_names(ids, legacy_df)) == set(log.get_article_names(ids)))
+        times = [(per_call(lambda: legacy_get_top_article_ids(10, legacy_df)),
+                  per_call(lambda: log.get_top_article_ids(10), 1000)),
+                 (per_call(lambda: legacy_get_top_articles(10, legacy_df)),
+                  per_call(lambda: log.get_top_articles(10), 1000)),
+                 (per_call(lambda: legacy_get_article_names(ids, legacy_df)),
+                  per_call(lambda: log.get_article_names(ids), 1000))]
+        print('{:>12,} {:>16.2f} {:>16.2f} '.format(size[2], mapper_time, ingest_time)
+              + ' '.join('{:>8.2f} -> {:<6.3f}'.format(1000 * old, 1000 * new).rjust(18 if i else 16)
+                         for i, (old, new) in enumerate(times))
+              + ' {:>8}'.format(str(same)))
+
+
+if __name__ == '__main__':
+    main()
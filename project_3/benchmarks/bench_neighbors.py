@@ -0,0 +1,83 @@
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from recommender.neighbors import UserNeighbors
+from bench_user_item import NOTEBOOK_SIZE, make_interactions, legacy_create_user_item_matrix
+
+SIZES = [NOTEBOOK_SIZE, (50000, 5000, 500000)]
+
+
+def legacy_get_top_sorted_users(user_id, df, user_item):
+    '''the notebook's get_top_sorted_users'''
+    user_inters = user_item.loc[user_id]
+    neighbors_df = pd.DataFrame(columns=['neighbor_id', 'similarity', 'num_interactions'],
+                                dtype='int64')
+    for other_id, interactions in user_item.iterrows():
+        if other_id == user_id:
+            continue
+        similarity = user_inters.dot(interactions)
+        num_interactions = df[df['user_id'] == other_id].shape[0]
+        neighbors_df.loc[other_id] = [other_id, similarity, num_interactions]
+    neighbors_df = neighbors_df.sort_values(by=['similarity', 'num_interactions'],
+                                            ascending=False)
+    return neighbors_df
+
+
+def legacy_user_user_recs_part2(user_id, df, user_item, m=10):
+    '''the notebook's user_user_recs_part2, without the article names'''
+    recs = set()
+    user_article_ids = user_item.loc[user_id][user_item.loc[user_id] == 1].index.values
+    for other_user in legacy_get_top_sorted_users(user_id, df, user_item).index.values.tolist():
+        other_article_ids = user_item.loc[other_user][user_item.loc[other_user] == 1].index.values
+        for movie in np.setdiff1d(other_article_ids, user_article_ids, assume_unique=True).tolist():
+            if len(recs) < m:
+                recs.add(movie)
+        if len(recs) > m - 1:
+            break
+    return list(recs)
+
+
+def main():
+    '''time one notebook neighbor query against recommending for every user
+    '''
+    df = make_interactions(*NOTEBOOK_SIZE, seed=0)
+    neighbors = UserNeighbors.from_interactions(df)
+    user_item = legacy_create_user_item_matrix(df)
+    for user_id in [1, 131]:
+        start = time.perf_counter()
+        legacy = legacy_get_top_sorted_users(user_id, df, user_item)
+        legacy_time = time.perf_counter() - start
+        start = time.perf_counter()
+        new = neighbors.get_top_sorted_users(user_id)
+        new_time = time.perf_counter() - start
+        same = (legacy.index.tolist() == new.index.tolist()
+                and (legacy['similarity'].to_numpy() == new['similarity'].to_numpy()).all()
+                and (legacy['num_interactions'].to_numpy() == new['num_interactions'].to_numpy()).all())
+        same_recs = (set(legacy_user_user_recs_part2(user_id, df, user_item))
+                     == set(neighbors.recommend([user_id])[user_id]))
+        print('get_top_sorted_users({}): {:.2f}s -> {:.2f} ms, same order: {}, same recs: {}'
+              .format(user_id, legacy_time, 1000 * new_time, same, same_recs))
+
+    print('\n{:>26} {:>14} {:>14} {:>16}'.format('users x articles', 'top 10 (s)', 'recs (s)',
+                                                   'notebook est. (h)'))
+    for size in SIZES:
+        df = make_interactions(*size, seed=size[0])
+        neighbors = UserNeighbors.from_interactions(df)
+        start = time.perf_counter()
+        neighbors.top_k(neighbors.user_item.index, k=10)
+        top_time = time.perf_counter() - start
+        start = time.perf_counter()
+        neighbors.recommend(m=10)
+        recs_time = time.perf_counter() - start
+        # the notebook's one-user-at-a-time loop grows with users x interactions
+        estimate = legacy_time * (size[0] / NOTEBOOK_SIZE[0]) * (size[2] / NOTEBOOK_SIZE[2]) * size[0] / 3600
+        print('{:>26} {:>14.2f} {:>14.2f} {:>16,.0f}'
+              .format('{:,} x {:,}'.format(*neighbors.user_item.shape), top_time, recs_time, estimate))
+
+
+if __name__ == '__main__':
+    main()
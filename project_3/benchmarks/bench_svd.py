@@ -0,0 +1,68 @@
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from recommender.svd import SVDRecommender, create_test_and_train_user_item
+from bench_user_item import NOTEBOOK_SIZE, make_interactions
+
+SIZES = [NOTEBOOK_SIZE, (20000, 2000, 200000), (100000, 5000, 1000000), (300000, 10000, 3000000)]
+N_COMPONENTS = 100
+# the notebook's dense np.linalg.svd is only run up to this many users x articles
+MAX_DENSE_CELLS = 5 * 10**6
+
+
+def measure(function):
+    '''the seconds and peak MB of memory allocated by function()'''
+    tracemalloc.start()
+    start = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def main():
+    '''time and measure the memory of fitting the sparse SVD as the interactions grow
+    '''
+    print('{:>12} {:>20} {:>12} {:>9} {:>12} {:>9} {:>11} {:>9} {:>12}'
+          .format('interactions', 'users x articles', 'arpack (s)', 'MB', 'random. (s)', 'MB',
+                  'dense (s)', 'MB', 'fold-in (us)'))
+    for n_users, n_articles, n_interactions in SIZES:
+        df = make_interactions(n_users, n_articles, n_interactions, seed=n_users)
+        n_train = int(.87 * len(df))
+        user_item_train, user_item_test, _, _ = create_test_and_train_user_item(df[:n_train], df[n_train:])
+        results = []
+        for algorithm in ['arpack', 'randomized']:
+            recommender = SVDRecommender(N_COMPONENTS, algorithm)
+            results.extend(measure(lambda: recommender.fit(user_item_train)))
+
+        dense = ('-', '-')
+        if user_item_train.shape[0] * user_item_train.shape[1] <= MAX_DENSE_CELLS:
+            matrix = user_item_train.to_frame()
+            dense = ['{:.2f}'.format(value) for value in measure(lambda: np.linalg.svd(matrix))]
+
+        # fold in the test users that are not in the training matrix
+        new_users = user_item_test.index.difference(user_item_train.index)[:1000]
+        start = time.perf_counter()
+        for user_id in new_users:
+            recommender.recommend(interactions=user_item_test.articles(user_id))
+        fold_in = (time.perf_counter() - start) / max(len(new_users), 1)
+        print('{:>12,} {:>20} {:>12.2f} {:>9.1f} {:>12.2f} {:>9.1f} {:>11} {:>9} {:>12.1f}'
+              .format(n_interactions, '{:,} x {:,}'.format(*user_item_train.shape), *results, *dense,
+                      10**6 * fold_in))
+
+    # choosing k: the notebook's sweep of the latent features from one decomposition
+    df = make_interactions(*NOTEBOOK_SIZE, seed=0)
+    user_item_train, user_item_test, _, _ = create_test_and_train_user_item(df.head(40000), df.tail(5993))
+    recommender = SVDRecommender(min(user_item_train.shape) - 1).fit(user_item_train)
+    seconds, _ = measure(lambda: recommender.sweep(range(0, 715, 15), user_item_test))
+    print('\nsweep of k = 0, 15, ..., 705 on the notebook split: {:.2f}s'.format(seconds))
+    print(recommender.sweep([10, 50, 100, 200, 400], user_item_test).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
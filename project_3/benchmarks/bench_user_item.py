@@ -0,0 +1,75 @@
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from recommender.user_item import create_user_item_matrix
+
+# the size of user-item-interactions.csv: users, articles and interactions
+NOTEBOOK_SIZE = (5149, 714, 45993)
+SIZES = [NOTEBOOK_SIZE, (20000, 1000, 200000), (200000, 10000, 2000000)]
+# the notebook's builder is only timed up to this many users x articles
+MAX_DENSE_CELLS = 25 * 10**6
+
+
+def make_interactions(n_users, n_articles, n_interactions, seed):
+    '''make a user-item-interactions.csv like frame, with a few very active
+    users and a few very popular articles
+    '''
+    rng = np.random.default_rng(seed)
+    # every user and article at least once, then skewed towards a few of them
+    users = np.concatenate([np.arange(n_users), rng.zipf(1.5, n_interactions - n_users) % n_users]) + 1
+    articles = np.concatenate([np.arange(n_articles), rng.zipf(1.3, n_interactions - n_articles) % n_articles])
+    # article ids are scattered, like the notebook's 0.0 to 1444.0
+    article_ids = rng.choice(2 * n_articles, n_articles, replace=False)
+    users, articles = rng.permutation(users), article_ids[rng.permutation(articles)]
+    return pd.DataFrame({'article_id': articles.astype('double'),
+                         'title': ['article {}'.format(article) for article in articles],
+                         'user_id': users})
+
+
+def legacy_create_user_item_matrix(df):
+    '''the notebook's create_user_item_matrix'''
+    user_item = df.groupby(['user_id', 'article_id']).count()['title'].unstack().\
+                       apply(lambda x: x.apply(lambda x: 0 if np.isnan(x) else 1))
+    return user_item
+
+
+def main():
+    '''time the dense and sparse user-item builders as the interaction log grows
+    '''
+    print('{:>28} {:>11} {:>11} {:>11} {:>11} {:>9} {:>10}'
+          .format('users x articles, inter.', 'dense (s)', 'sparse (s)', 'dense MB', 'sparse MB',
+                  'lookup us', 'frame eq.'))
+    for n_users, n_articles, n_interactions in SIZES:
+        df = make_interactions(n_users, n_articles, n_interactions, seed=n_users)
+        start = time.perf_counter()
+        user_item = create_user_item_matrix(df)
+        sparse_time = time.perf_counter() - start
+
+        # time getting the articles of a user, as get_user_articles does
+        users = user_item.index[::max(1, len(user_item.index) // 1000)]
+        start = time.perf_counter()
+        for user_id in users:
+            user_item.articles(user_id)
+        lookup = (time.perf_counter() - start) / len(users)
+
+        dense_time = dense_mb = equal = None
+        if user_item.shape[0] * user_item.shape[1] <= MAX_DENSE_CELLS:
+            start = time.perf_counter()
+            dense = legacy_create_user_item_matrix(df)
+            dense_time = time.perf_counter() - start
+            dense_mb = dense.memory_usage(index=True).sum() / 2**20
+            equal = user_item.to_frame().equals(dense)
+        print('{:>28} {:>11} {:>11.3f} {:>11} {:>11.2f} {:>9.1f} {:>10}'
+              .format('{:,} x {:,}, {:,}'.format(*user_item.shape, n_interactions),
+                      '-' if dense_time is None else '{:.2f}'.format(dense_time), sparse_time,
+                      '-' if dense_mb is None else '{:.1f}'.format(dense_mb),
+                      user_item.memory_usage() / 2**20, 10**6 * lookup,
+                      '-' if equal is None else str(equal)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,318 @@
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from .user_item import UserItemMatrix
+from .neighbors import UserNeighbors, collect_unseen
+
+INDEX_VERSION = 1
+ARRAYS = ('user_ids', 'article_ids', 'user_counts', 'article_counts', 'user_order', 'article_order',
+          'indptr', 'indices', 'user_neighbors', 'user_similarities', 'article_neighbors', 'article_similarities')
+
+
+class SimilarityIndex:
+    '''
+    A persistent index of each user's k most similar users and each article's
+    k most similar articles.
+
+    Users are ranked as in get_top_sorted_users: by the dot product of their
+    rows of the user-item matrix, then by number of interactions and then by
+    user id. Articles are ranked the same way by the users they share, then
+    by number of interactions and then by article id. The neighbor lists are
+    int32 arrays of rows saved as .npy files in a directory, with the ids,
+    interaction counts and the CSR structure of the user-item matrix, and
+    memory-mapped when the index is loaded, so a lookup reads k entries from
+    disk instead of scanning the matrix.
+
+    Only neighbors with a positive similarity are stored (the rest of a list
+    is -1). A list is completed when it is read from the users or articles
+    with the most interactions, which are kept in order, so a change of
+    interaction counts doesn't change any stored list.
+
+    update(df) adds new interaction rows, re-scores only the users and
+    articles with new interactions and merges them into the lists of the
+    others, then writes the index to a new directory that replaces the old
+    one.
+    '''
+
+    def __init__(self, path, arrays, k):
+        '''
+        INPUT:
+        path - (str) the directory the index is saved in
+        arrays - (dict) name to array, for every name in ARRAYS
+        k - (int) the number of neighbors kept for each user and article
+        '''
+        self.path = path
+        self.arrays = arrays
+        self.k = k
+        self.user_index = pd.Index(arrays['user_ids'])
+        self.article_index = pd.Index(arrays['article_ids'])
+
+    @classmethod
+    def build(cls, df, path, k=20):
+        '''
+        INPUT:
+        df - (pandas dataframe) interactions with user_id and article_id columns
+        path - (str) the directory to save the index in
+        k - (int) the number of neighbors kept for each user and article
+
+        OUTPUT:
+        index - (SimilarityIndex) the saved index, memory-mapped
+        '''
+        user_item = UserItemMatrix.from_interactions(df)
+        user_counts = df['user_id'].value_counts().reindex(user_item.index).to_numpy()
+        article_counts = df['article_id'].value_counts().reindex(user_item.columns).to_numpy()
+        index = cls(path, cls._structure(user_item.index.values, user_item.columns.values,
+                                         user_counts, article_counts, user_item.matrix), k)
+        users, articles = index._engines()
+        index._rescore(users, np.arange(users.user_item.shape[0]), 'user')
+        index._rescore(articles, np.arange(articles.user_item.shape[0]), 'article')
+        index.save()
+        return cls.load(path)
+
+    @classmethod
+    def load(cls, path):
+        '''
+        INPUT:
+        path - (str) the directory of a saved index
+
+        OUTPUT:
+        index - (SimilarityIndex) with its arrays memory-mapped read-only
+        '''
+        with open(os.path.join(path, 'index.json')) as f:
+            meta = json.load(f)
+        if meta['version'] != INDEX_VERSION:
+            raise ValueError('{} holds a version {} index, expected {}'.format(path, meta['version'], INDEX_VERSION))
+        arrays = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r', allow_pickle=False)
+                  for name in ARRAYS}
+        return cls(path, arrays, meta['k'])
+
+    @staticmethod
+    def _structure(user_ids, article_ids, user_counts, article_counts, matrix):
+        '''the arrays of an index, with empty neighbor lists'''
+        arrays = {'user_ids': np.asarray(user_ids), 'article_ids': np.asarray(article_ids),
+                  'user_counts': np.asarray(user_counts, dtype='int64'),
+                  'article_counts': np.asarray(article_counts, dtype='int64'),
+                  'indptr': matrix.indptr.astype('int64'), 'indices': matrix.indices.astype('int32')}
+        # rows by interactions (most first) and then by id, to complete the lists
+        for kind in ['user', 'article']:
+            order = np.lexsort((arrays[kind + '_ids'], -arrays[kind + '_counts']))
+            arrays[kind + '_order'] = order.astype('int32')
+        return arrays
+
+    def _matrix(self, shape=None):
+        '''the user-item matrix as a scipy.sparse CSR matrix, grown to shape with empty rows and columns'''
+        shape = shape or (len(self.user_index), len(self.article_index))
+        indptr, indices = np.asarray(self.arrays['indptr']), np.asarray(self.arrays['indices'])
+        indptr = np.concatenate([indptr, np.full(shape[0] + 1 - len(indptr), indptr[-1])])
+        return sparse.csr_matrix((np.ones(len(indices), dtype='uint8'), indices, indptr), shape=shape)
+
+    def _engines(self):
+        '''UserNeighbors over the users (rows) and over the articles (columns)'''
+        matrix = self._matrix()
+        users = UserNeighbors(UserItemMatrix(matrix, self.user_index, self.article_index),
+                              self.arrays['user_counts'])
+        articles = UserNeighbors(UserItemMatrix(matrix.T.tocsr(), self.article_index, self.user_index),
+                                 self.arrays['article_counts'])
+        return users, articles
+
+    def _rescore(self, engine, rows, kind):
+        '''score the rows of engine and write their neighbor lists into the index'''
+        n_rows = engine.user_item.shape[0]
+        for name, fill in [('neighbors', -1), ('similarities', 0)]:
+            old = self.arrays.get('{}_{}'.format(kind, name))
+            new = np.full((n_rows, self.k), fill, dtype='int32')
+            if old is not None:
+                new[:len(old)] = old
+            self.arrays['{}_{}'.format(kind, name)] = new
+        neighbors, similarities = self.arrays[kind + '_neighbors'], self.arrays[kind + '_similarities']
+        for block, top, sims in engine._blocks(np.asarray(rows), self.k):
+            neighbors[block, :top.shape[1]] = np.where(sims > 0, top, -1)
+            similarities[block, :top.shape[1]] = sims
+
+    def _merge(self, engine, changed, neighbors, similarities):
+        '''
+        INPUT:
+        engine - (UserNeighbors) over the updated matrix and counts
+        changed - (array) rows with new interactions
+        neighbors - (array) the old neighbor lists, padded for new rows
+        similarities - (array) the old similarities, padded for new rows
+
+        OUTPUT:
+        merged - (int) the number of lists updated in place
+
+        Description:
+        Similarities and interaction counts only grow as interactions are
+        added, so a row without new interactions keeps its order of every
+        other unchanged row: its new neighbors are the best k of its old list
+        and the changed rows it shares articles with. Those lists are merged
+        in place; the changed rows themselves are re-scored.
+        '''
+        counts, ids = engine.interaction_counts, engine.user_item.index.values
+        shared = (engine._matrix[changed] @ engine._matrix_t).tocoo()
+        others, rows, shares = changed[shared.row], shared.col, shared.data
+        # only changed rows sharing as much as the k-th neighbor can get into a list
+        keep = ~np.isin(rows, changed) & (shares >= similarities[rows, -1])
+        others, rows, shares = others[keep], rows[keep], shares[keep]
+        touched = np.unique(rows)
+        if not len(touched):
+            return 0
+
+        listed_rows = np.repeat(touched, self.k)
+        listed, listed_shares = neighbors[touched].ravel(), similarities[touched].ravel()
+        rows = np.concatenate([rows, listed_rows[listed >= 0]])
+        candidates = np.concatenate([others, listed[listed >= 0]])
+        shares = np.concatenate([shares, listed_shares[listed >= 0]])
+        # a listed changed row appears twice, keep its new (larger) similarity
+        order = np.lexsort((-shares, candidates, rows))
+        rows, candidates, shares = rows[order], candidates[order], shares[order]
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = (rows[1:] != rows[:-1]) | (candidates[1:] != candidates[:-1])
+        rows, candidates, shares = rows[first], candidates[first], shares[first]
+
+        order = np.lexsort((ids[candidates], -counts[candidates], -shares, rows))
+        rows, candidates, shares = rows[order], candidates[order], shares[order]
+        starts = np.searchsorted(rows, touched)
+        position = np.arange(len(rows)) - np.repeat(starts, np.diff(np.append(starts, len(rows))))
+        top = position < self.k
+        neighbors[touched], similarities[touched] = -1, 0
+        neighbors[rows[top], position[top]] = candidates[top]
+        similarities[rows[top], position[top]] = shares[top]
+        return len(touched)
+
+    def update(self, df):
+        '''
+        INPUT:
+        df - (pandas dataframe) new interaction rows with user_id and article_id columns
+
+        OUTPUT:
+        updated - (tuple) for the users and for the articles, the number
+                  re-scored and the number of lists merged in place
+
+        Description:
+        Adds the interactions to the index (new users are appended, new
+        articles are inserted in article id order, as a rebuild has them, so
+        recommend walks a neighbor's articles in the same order), re-scores
+        the users and articles with new interactions, merges them into the
+        lists of the others they share anything with and saves the index.
+        '''
+        df = df.dropna(subset=['user_id', 'article_id'])
+        new_users = pd.Index(df['user_id'].unique()).difference(self.user_index)
+        new_articles = pd.Index(df['article_id'].unique()).difference(self.article_index)
+        user_index = self.user_index.append(new_users)
+        article_index = self.article_index.append(new_articles).sort_values()
+        # the new column of each old article
+        moved = article_index.get_indexer(self.article_index)
+        rows = user_index.get_indexer(df['user_id'])
+        cols = article_index.get_indexer(df['article_id'])
+
+        matrix = self._matrix((len(user_index), len(article_index)))
+        matrix.indices = moved[matrix.indices].astype(matrix.indices.dtype)
+        added = sparse.csr_matrix((np.ones(len(rows), dtype='int32'), (rows, cols)), shape=matrix.shape)
+        matrix = ((matrix + added) > 0).astype('uint8').tocsr()
+        matrix.sort_indices()
+        user_counts = np.bincount(rows, minlength=len(user_index))
+        user_counts[:len(self.user_index)] += self.arrays['user_counts']
+        article_counts = np.bincount(cols, minlength=len(article_index))
+        article_counts[moved] += self.arrays['article_counts']
+
+        old = {name: np.asarray(self.arrays[name]) for name in ARRAYS if name.endswith(('neighbors', 'similarities'))}
+        old['article_neighbors'] = np.where(old['article_neighbors'] >= 0, moved[old['article_neighbors']], -1)
+        positions = {'user': np.arange(len(self.user_index)), 'article': moved}
+        self.arrays = self._structure(user_index.values, article_index.values, user_counts, article_counts, matrix)
+        self.arrays.update(old)
+        self.user_index, self.article_index = user_index, article_index
+
+        updated = []
+        for engine, changed, kind in zip(self._engines(), [np.unique(rows), np.unique(cols)], ['user', 'article']):
+            neighbors = np.full((engine.user_item.shape[0], self.k), -1, dtype='int32')
+            neighbors[positions[kind]] = old[kind + '_neighbors']
+            similarities = np.zeros((engine.user_item.shape[0], self.k), dtype='int32')
+            similarities[positions[kind]] = old[kind + '_similarities']
+            merged = self._merge(engine, changed, neighbors, similarities)
+            self.arrays[kind + '_neighbors'], self.arrays[kind + '_similarities'] = neighbors, similarities
+            self._rescore(engine, changed, kind)
+            updated.append((len(changed), merged))
+        self.save()
+        self.arrays = SimilarityIndex.load(self.path).arrays
+        return tuple(updated)
+
+    def save(self):
+        '''write the index to a temporary directory and move it into place'''
+        tmp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+        os.makedirs(tmp_path)
+        try:
+            for name in ARRAYS:
+                np.save(os.path.join(tmp_path, name + '.npy'), np.asarray(self.arrays[name]), allow_pickle=False)
+            with open(os.path.join(tmp_path, 'index.json'), 'w') as f:
+                json.dump({'version': INDEX_VERSION, 'k': self.k}, f)
+            old_path = '{}.{}.old'.format(self.path, os.getpid())
+            if os.path.exists(self.path):
+                os.rename(self.path, old_path)
+            os.rename(tmp_path, self.path)
+            shutil.rmtree(old_path, ignore_errors=True)
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    def _neighbors(self, kind, row, k):
+        '''
+        INPUT:
+        kind - (str) 'user' or 'article'
+        row - (int) the row of the user or article
+        k - (int) the number of neighbors, at most the index's k
+
+        OUTPUT:
+        neighbors - (array) the rows of the k neighbors, the stored ones and
+                    then those with the most interactions
+        '''
+        k = self.k if k is None else min(k, self.k)
+        neighbors = self.arrays[kind + '_neighbors'][row]
+        neighbors = neighbors[neighbors >= 0][:k]
+        if len(neighbors) < k:
+            candidates = self.arrays[kind + '_order'][:k + len(neighbors) + 1]
+            candidates = candidates[(candidates != row) & ~np.isin(candidates, neighbors)]
+            neighbors = np.concatenate([neighbors, candidates[:k - len(neighbors)]])
+        return neighbors
+
+    def similar_users(self, user_id, k=None):
+        '''
+        INPUT:
+        user_id - (int) a user id
+        k - (int) the number of users to return, at most the index's k
+
+        OUTPUT:
+        similar_users - (list) the ids of the most similar users, most similar first
+        '''
+        neighbors = self._neighbors('user', self.user_index.get_loc(user_id), k)
+        return self.arrays['user_ids'][neighbors].tolist()
+
+    def similar_articles(self, article_id, k=None):
+        '''
+        INPUT:
+        article_id - (float) an article id
+        k - (int) the number of articles to return, at most the index's k
+
+        OUTPUT:
+        similar_articles - (list) the ids of the articles most often seen by
+                           the same users, most similar first
+        '''
+        neighbors = self._neighbors('article', self.article_index.get_loc(article_id), k)
+        return self.arrays['article_ids'][neighbors].tolist()
+
+    def recommend(self, user_id, m=10):
+        '''
+        INPUT:
+        user_id - (int) a user id
+        m - (int) the number of recommendations
+
+        OUTPUT:
+        recs - (list) up to m article ids the user hasn't seen, taken from the
+               user's k nearest neighbors as user_user_recs_part2 does
+        '''
+        row = self.user_index.get_loc(user_id)
+        neighbors = self._neighbors('user', row, self.k)
+        recs = collect_unseen(self.arrays['indptr'], self.arrays['indices'], row, neighbors, m)
+        return self.arrays['article_ids'][recs].tolist()
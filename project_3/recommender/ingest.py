@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+
+COLUMNS = ['article_id', 'title', 'email']
+
+
+def email_mapper(emails):
+    '''
+    INPUT:
+    emails - (pandas series) the email column of user-item-interactions.csv
+
+    OUTPUT:
+    email_encoded - (array) a user id for each email: 1 for the first email seen,
+                    2 for the next new one and so on (every missing email is one user)
+    '''
+    codes, _ = pd.factorize(emails, use_na_sentinel=False)
+    return codes + 1
+
+
+class InteractionLog:
+    '''
+    Ingests user-item-interactions.csv a chunk at a time.
+
+    Emails are mapped to user ids as the notebook's email_mapper does (in
+    order of first appearance, starting at 1) with pd.factorize, the
+    number of interactions of each article is counted as the chunks arrive
+    and the first title seen for each article is kept. The top articles and
+    the titles of articles are then looked up in these tables instead of
+    scanning the log; the ranking is sorted once after each chunk.
+    '''
+
+    def __init__(self):
+        self.emails = pd.Index([], dtype='object')
+        self.article_index = pd.Index([], dtype='double', name='article_id')
+        self.article_counts = np.zeros(0, dtype='int64')
+        self.titles = np.empty(0, dtype='object')
+        self.n_interactions = 0
+        self._ranking = None
+
+    @classmethod
+    def read_csv(cls, filepath, chunksize=10**6):
+        '''
+        INPUT:
+        filepath - (str) path to user-item-interactions.csv
+        chunksize - (int) rows read at a time
+
+        OUTPUT:
+        log - (InteractionLog) the tables of the whole file
+        df - (pandas dataframe) the interactions with article_id, title and
+             user_id columns, as df is after email_mapper in the notebook
+        '''
+        log = cls()
+        chunks = [log.add(chunk) for chunk in pd.read_csv(filepath, usecols=COLUMNS, chunksize=chunksize)]
+        return log, pd.concat(chunks, ignore_index=True)
+
+    def user_ids(self, emails):
+        '''
+        INPUT:
+        emails - (array-like) emails
+
+        OUTPUT:
+        user_ids - (array) the user id of each email, -1 for an email not seen yet
+        '''
+        codes = self.emails.get_indexer(pd.Index(emails, dtype='object'))
+        return np.where(codes >= 0, codes + 1, -1)
+
+    def add(self, chunk):
+        '''
+        INPUT:
+        chunk - (pandas dataframe) interaction rows with article_id, title and email columns
+
+        OUTPUT:
+        df - (pandas dataframe) the chunk with the email column replaced by user_id
+        '''
+        codes, uniques = pd.factorize(chunk['email'], use_na_sentinel=False)
+        uniques = pd.Index(uniques, dtype='object')
+        known = self.emails.get_indexer(uniques)
+        new = known < 0
+        known[new] = len(self.emails) + np.arange(new.sum())
+        self.emails = self.emails.append(uniques[new])
+
+        articles = chunk['article_id'].to_numpy(dtype='double')
+        rows, uniques = pd.factorize(articles)
+        positions = self.article_index.get_indexer(uniques)
+        new = positions < 0
+        positions[new] = len(self.article_index) + np.arange(new.sum())
+        # the first title of each new article in the chunk: codes are numbered
+        # in order of appearance, so an article first appears where the running
+        # maximum of the codes goes up
+        first = np.flatnonzero(np.diff(np.maximum.accumulate(rows), prepend=-1) > 0)
+        titles = chunk['title'].iloc[first[new]].to_numpy(dtype='object')
+        self.titles = np.concatenate([self.titles, titles])
+        self.article_index = self.article_index.append(pd.Index(uniques[new], name='article_id'))
+        self.article_counts = np.concatenate([self.article_counts, np.zeros(new.sum(), dtype='int64')])
+        self.article_counts += np.bincount(positions[rows[rows >= 0]], minlength=len(self.article_index))
+        self.n_interactions += len(chunk)
+        self._ranking = None
+
+        df = chunk.drop(columns='email')
+        df['user_id'] = known[codes] + 1
+        return df
+
+    @property
+    def ranking(self):
+        '''the positions of the articles from the most interactions to the fewest (ties by article id)'''
+        if self._ranking is None:
+            self._ranking = np.lexsort((self.article_index.values, -self.article_counts))
+        return self._ranking
+
+    def get_top_article_ids(self, n):
+        '''
+        INPUT:
+        n - (int) the number of top articles to return
+
+        OUTPUT:
+        top_articles - (list) A list of the top 'n' article ids
+        '''
+        return self.article_index.values[self.ranking[:n]].tolist()
+
+    def get_top_articles(self, n):
+        '''
+        INPUT:
+        n - (int) the number of top articles to return
+
+        OUTPUT:
+        top_articles - (list) A list of the top 'n' article titles
+        '''
+        return self.titles[self.ranking[:n]].tolist()
+
+    def get_article_names(self, article_ids):
+        '''
+        INPUT:
+        article_ids - (list) a list of article ids
+
+        OUTPUT:
+        article_names - (list) a list of article names associated with the list of article ids
+                        (this is identified by the title column), unknown ids are left out
+        '''
+        positions = self.article_index.get_indexer(pd.Index(article_ids).astype('double'))
+        return self.titles[positions[positions >= 0]].tolist()
@@ -0,0 +1,193 @@
+import numpy as np
+import pandas as pd
+
+from .user_item import UserItemMatrix
+
+
+def collect_unseen(indptr, indices, row, neighbors, m):
+    '''
+    INPUT:
+    indptr, indices - (arrays) the CSR structure of the user-item matrix
+    row - (int) the row of the user to recommend to
+    neighbors - (array) the rows of the user's neighbors, most similar first
+    m - (int) the number of recommendations
+
+    OUTPUT:
+    recs - (list) the columns of up to m articles the user has not seen, taken
+           from each neighbor in turn (in column order within a neighbor)
+    '''
+    seen = indices[indptr[row]:indptr[row + 1]]
+    recs = []
+    for neighbor in neighbors:
+        new = np.setdiff1d(indices[indptr[neighbor]:indptr[neighbor + 1]], seen, assume_unique=True)
+        new = new[~np.isin(new, recs)][:m - len(recs)]
+        recs.extend(new.tolist())
+        if len(recs) >= m:
+            break
+    return recs
+
+
+class UserNeighbors:
+    '''
+    Top-k most similar users for many users at once.
+
+    The similarity of two users is the dot product of their rows of the
+    user-item matrix (the number of articles both interacted with). Ties are
+    broken by the other user's number of interactions and then by the lower
+    user id, the order get_top_sorted_users sorts its neighbors_df in. Users
+    are scored a block at a time with one sparse matrix product, so memory
+    stays at block_cells similarities, and the top k of each row are picked
+    with argpartition.
+    '''
+
+    def __init__(self, user_item, interaction_counts=None, block_cells=2**22):
+        '''
+        INPUT:
+        user_item - (UserItemMatrix) matrix of users by articles
+        interaction_counts - (array-like) the number of interactions of each
+                             user (row of user_item), the number of articles
+                             each user interacted with by default
+        block_cells - (int) the most similarities held in memory at a time
+        '''
+        self.user_item = user_item
+        self.block_cells = block_cells
+        self._matrix = user_item.matrix.astype('int32')
+        self._matrix_t = self._matrix.T.tocsr()
+        if interaction_counts is None:
+            interaction_counts = np.diff(user_item.matrix.indptr)
+        self.interaction_counts = np.asarray(interaction_counts, dtype='int64')
+
+        # users ranked by interactions (most first) and then by id, as a key
+        # added to similarity * n_users, larger for the users ranked first
+        n_users = user_item.shape[0]
+        order = np.lexsort((user_item.index.values, -self.interaction_counts))
+        self._tiebreak = np.empty(n_users, dtype='int64')
+        self._tiebreak[order] = np.arange(n_users - 1, -1, -1)
+
+    @classmethod
+    def from_interactions(cls, df, block_cells=2**22):
+        '''
+        INPUT:
+        df - (pandas dataframe) interactions with user_id and article_id columns
+        block_cells - (int) the most similarities held in memory at a time
+
+        OUTPUT:
+        neighbors - (UserNeighbors) with each user's number of rows in df as
+                    their interaction count, as in get_top_sorted_users
+        '''
+        user_item = UserItemMatrix.from_interactions(df)
+        counts = df['user_id'].value_counts().reindex(user_item.index).to_numpy()
+        return cls(user_item, counts, block_cells)
+
+    def _blocks(self, rows, k):
+        '''
+        INPUT:
+        rows - (array) the user_item rows of the users to score
+        k - (int) the number of neighbors of each user
+
+        OUTPUT:
+        yields (block, neighbors, similarities) - a block of rows, the rows of
+               their k nearest neighbors in order and the similarities
+        '''
+        n_users = self._matrix.shape[0]
+        k = min(k, n_users - 1)
+        step = max(1, self.block_cells // n_users)
+        for start in range(0, len(rows), step):
+            block = rows[start:start + step]
+            similarities = (self._matrix[block] @ self._matrix_t).toarray()
+            keys = similarities.astype('int64') * n_users + self._tiebreak
+            # a user is never their own neighbor
+            keys[np.arange(len(block)), block] = -1
+            if k < n_users - 1:
+                top = np.argpartition(keys, n_users - k, axis=1)[:, n_users - k:]
+            else:
+                top = np.broadcast_to(np.arange(n_users), keys.shape)
+            top = np.take_along_axis(top, np.argsort(-np.take_along_axis(keys, top, axis=1), axis=1), axis=1)
+            yield block, top[:, :k], np.take_along_axis(similarities, top[:, :k], axis=1)
+
+    def top_k(self, user_ids, k=10):
+        '''
+        INPUT:
+        user_ids - (list) user ids
+        k - (int) the number of neighbors of each user
+
+        OUTPUT:
+        neighbor_ids - (array) users x k, the ids of each user's neighbors,
+                       most similar first
+        similarities - (array) users x k, their similarities
+        '''
+        rows = self.user_item.user_rows(user_ids)
+        blocks = list(self._blocks(rows, k))
+        neighbors = np.concatenate([top for _, top, _ in blocks])
+        similarities = np.concatenate([sims for _, _, sims in blocks])
+        return self.user_item.index.values[neighbors], similarities
+
+    def find_similar_users(self, user_id, k=None):
+        '''
+        INPUT:
+        user_id - (int) a user_id
+        k - (int) the number of users to return, every other user by default
+
+        OUTPUT:
+        similar_users - (list) an ordered list where the closest users (largest dot product users)
+                        are listed first
+        '''
+        neighbor_ids, _ = self.top_k([user_id], k or self.user_item.shape[0])
+        return neighbor_ids[0].tolist()
+
+    def get_top_sorted_users(self, user_id, k=None):
+        '''
+        INPUT:
+        user_id - (int)
+        k - (int) the number of neighbors to return, every other user by default
+
+        OUTPUT:
+        neighbors_df - (pandas dataframe) indexed by neighbor_id, with:
+                        neighbor_id - is a neighbor user_id
+                        similarity - measure of the similarity of each user to the provided user_id
+                        num_interactions - the number of articles viewed by the user
+                       sorted by similarity and then by number of interactions, highest first
+        '''
+        rows = self.user_item.user_rows([user_id])
+        _, top, similarities = next(self._blocks(rows, k or self.user_item.shape[0]))
+        neighbor_ids = self.user_item.index.values[top[0]]
+        return pd.DataFrame({'neighbor_id': neighbor_ids,
+                             'similarity': similarities[0].astype('int64'),
+                             'num_interactions': self.interaction_counts[top[0]]},
+                            index=neighbor_ids)
+
+    def _collect(self, row, neighbors, m):
+        '''the ids of up to m articles of the neighbors, in order, that the user has not seen'''
+        recs = collect_unseen(self.user_item.matrix.indptr, self.user_item.matrix.indices, row, neighbors, m)
+        return self.user_item.columns.values[recs].tolist()
+
+    def recommend(self, user_ids=None, m=10, k=50):
+        '''
+        INPUT:
+        user_ids - (list) user ids, every user by default
+        m - (int) the number of recommendations for each user
+        k - (int) the number of neighbors considered first
+
+        OUTPUT:
+        recs - (dict) user id to a list of up to m article ids
+
+        Description:
+        Loops through each user's neighbors from the most similar, as
+        user_user_recs_part2 does, adding the articles the user hasn't seen
+        (in article id order for each neighbor) until m are found. Users whose
+        k nearest neighbors don't have m new articles between them are scored
+        again against every user.
+        '''
+        rows = np.arange(self.user_item.shape[0]) if user_ids is None else self.user_item.user_rows(user_ids)
+        user_index = self.user_item.index.values
+        recs, unfilled = {}, []
+        for block, top, _ in self._blocks(rows, k):
+            for row, neighbors in zip(block, top):
+                recs[user_index[row]] = self._collect(row, neighbors, m)
+                if len(recs[user_index[row]]) < m:
+                    unfilled.append(row)
+        if unfilled and k < self.user_item.shape[0] - 1:
+            for block, top, _ in self._blocks(np.array(unfilled), self.user_item.shape[0]):
+                for row, neighbors in zip(block, top):
+                    recs[user_index[row]] = self._collect(row, neighbors, m)
+        return recs
@@ -0,0 +1,246 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.linalg import svds
+
+from .user_item import UserItemMatrix
+
+ALGORITHMS = ('arpack', 'randomized')
+
+
+def create_test_and_train_user_item(df_train, df_test):
+    '''
+    INPUT:
+    df_train - training dataframe
+    df_test - test dataframe
+
+    OUTPUT:
+    user_item_train - (UserItemMatrix) a user-item matrix of the training dataframe
+                      (unique users for each row and unique articles for each column)
+    user_item_test - (UserItemMatrix) a user-item matrix of the testing dataframe
+                     (unique users for each row and unique articles for each column)
+    test_idx - all of the test user ids
+    test_arts - all of the test article ids
+    '''
+    user_item_train = UserItemMatrix.from_interactions(df_train)
+    user_item_test = UserItemMatrix.from_interactions(df_test)
+    return user_item_train, user_item_test, user_item_test.index.values, user_item_test.columns.values
+
+
+def randomized_svd(matrix, n_components, n_oversamples=10, n_iter=4, random_state=0):
+    '''
+    INPUT:
+    matrix - (scipy.sparse matrix) the matrix to decompose
+    n_components - (int) the number of singular values and vectors
+    n_oversamples - (int) extra random directions sampled for accuracy
+    n_iter - (int) power iterations, more for slowly decaying singular values
+    random_state - (int) seed of the random projection
+
+    OUTPUT:
+    u, s, vt - the top n_components singular vectors and values, largest first
+
+    Description:
+    The randomized range finder of Halko, Martinsson and Tropp: the range of
+    the matrix is sampled with a random projection sharpened by power
+    iterations, and the small projected matrix is decomposed exactly.
+    '''
+    rng = np.random.default_rng(random_state)
+    n_random = min(n_components + n_oversamples, min(matrix.shape))
+    q = matrix @ rng.standard_normal((matrix.shape[1], n_random))
+    for _ in range(n_iter):
+        q, _ = np.linalg.qr(q)
+        q, _ = np.linalg.qr(matrix.T @ q)
+        q = matrix @ q
+    q, _ = np.linalg.qr(q)
+    u, s, vt = np.linalg.svd((matrix.T @ q).T, full_matrices=False)
+    return (q @ u)[:, :n_components], s[:n_components], vt[:n_components]
+
+
+class SVDRecommender:
+    '''
+    Matrix factorization of a sparse user-item matrix.
+
+    The matrix is decomposed once into its n_components largest singular
+    values and vectors, without ever making it dense. Any number of latent
+    features k up to n_components is then the first k of them, so k can be
+    chosen by sweeping it over one decomposition. Users who are not in the
+    training matrix are folded in by projecting their interactions onto the
+    article factors, without a refit.
+    '''
+
+    def __init__(self, n_components=100, algorithm='arpack', random_state=0):
+        '''
+        INPUT:
+        n_components - (int) the most latent features used
+        algorithm - (str) 'arpack' (scipy's svds) or 'randomized'
+        random_state - (int) seed of the decomposition's starting vectors
+        '''
+        self.n_components = n_components
+        self.algorithm = algorithm
+        self.random_state = random_state
+
+    def fit(self, user_item):
+        '''
+        INPUT:
+        user_item - (UserItemMatrix) the training matrix
+
+        OUTPUT:
+        self - with u_, s_ and vt_ the decomposition, largest singular values first
+        '''
+        if self.algorithm not in ALGORITHMS:
+            raise ValueError('algorithm must be one of {}'.format(ALGORITHMS))
+        self.user_item_ = user_item
+        matrix = user_item.matrix.astype('double')
+        n_components = min(self.n_components, min(matrix.shape) - 1)
+        if self.algorithm == 'arpack':
+            rng = np.random.default_rng(self.random_state)
+            u, s, vt = svds(matrix, k=n_components, v0=rng.uniform(-1, 1, min(matrix.shape)))
+            order = np.argsort(s)[::-1]
+            u, s, vt = u[:, order], s[order], vt[order]
+        else:
+            u, s, vt = randomized_svd(matrix, n_components, random_state=self.random_state)
+        self.u_, self.s_, self.vt_ = u, s, vt
+        return self
+
+    def _check_k(self, ks):
+        '''raise if a number of latent features is more than the decomposition has'''
+        if np.max(ks, initial=0) > len(self.s_):
+            raise ValueError('{} latent features requested, but only {} were computed; fit with a '
+                             'larger n_components'.format(np.max(ks), len(self.s_)))
+
+    def _k(self, k):
+        if k is None:
+            return len(self.s_)
+        self._check_k([k])
+        return k
+
+    def fold_in(self, interactions, k=None):
+        '''
+        INPUT:
+        interactions - (scipy.sparse matrix or UserItemMatrix) rows of users
+                       over the training articles; a UserItemMatrix is
+                       aligned to the training articles by id, articles the
+                       training matrix doesn't have are dropped
+        k - (int) the number of latent features, at most len(s_), all of them by default
+
+        OUTPUT:
+        u - (array) the users' latent features, interactions @ V_k / s_k
+        '''
+        k = self._k(k)
+        if isinstance(interactions, UserItemMatrix):
+            cols = self.user_item_.columns.get_indexer(interactions.columns)
+            known = interactions.matrix[:, np.flatnonzero(cols >= 0)].tocoo()
+            interactions = sparse.csr_matrix((known.data, (known.row, cols[cols >= 0][known.col])),
+                                             shape=(interactions.shape[0], self.vt_.shape[1]))
+        return (interactions @ self.vt_[:k].T) / self.s_[:k]
+
+    def predict(self, user_ids, article_ids=None, k=None):
+        '''
+        INPUT:
+        user_ids - (list) ids of users in the training matrix
+        article_ids - (list) ids of articles in the training matrix, every article by default
+        k - (int) the number of latent features, at most len(s_), all of them by default
+
+        OUTPUT:
+        predictions - (array) users x articles, the rank k estimate of the matrix
+        '''
+        k = self._k(k)
+        rows = self.user_item_.user_rows(user_ids)
+        vt = self.vt_[:k]
+        if article_ids is not None:
+            vt = vt[:, self.user_item_.columns.get_indexer(article_ids)]
+        return (self.u_[rows, :k] * self.s_[:k]) @ vt
+
+    def recommend(self, user_id=None, interactions=None, m=10, k=None):
+        '''
+        INPUT:
+        user_id - (int) a user in the training matrix
+        interactions - (list) for a new user, the ids of the articles they interacted with
+        m - (int) the number of recommendations
+        k - (int) the number of latent features, at most len(s_), all of them by default
+
+        OUTPUT:
+        recs - (list) the ids of the m unseen articles with the highest estimates,
+               the most popular articles for a user without interactions
+        '''
+        k = self._k(k)
+        columns = self.user_item_.columns
+        if user_id is not None:
+            row = self.user_item_.user_rows(user_id)
+            latent = self.u_[row, :k]
+            seen = self.user_item_.matrix.indices[self.user_item_.matrix.indptr[row]:
+                                                  self.user_item_.matrix.indptr[row + 1]]
+        else:
+            seen = columns.get_indexer(pd.Index(interactions).unique())
+            seen = seen[seen >= 0]
+            user = sparse.csr_matrix((np.ones(len(seen)), (np.zeros(len(seen), dtype='int64'), seen)),
+                                     shape=(1, len(columns)))
+            latent = self.fold_in(user, k)[0]
+        scores = (latent * self.s_[:k]) @ self.vt_[:k]
+        if not len(seen):
+            # nothing to fold in, recommend the most popular articles as for a new user
+            scores = self.user_item_.sum(axis=0).to_numpy().astype('double')
+        scores[seen] = -np.inf
+        m = min(m, len(columns) - len(seen))
+        if m <= 0:
+            return []
+        top = np.argpartition(-scores, m - 1)[:m] if m < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')][:m]
+        return columns.values[top].tolist()
+
+    def sweep(self, num_latent_features, user_item_test=None, block_size=1024):
+        '''
+        INPUT:
+        num_latent_features - (list) the numbers of latent features to evaluate, at
+                              most len(s_) (n_components, or one less than the
+                              smaller side of the training matrix), a ValueError
+                              is raised otherwise
+        user_item_test - (UserItemMatrix) the test matrix, its users and
+                         articles in the training matrix are scored
+        block_size - (int) users estimated at a time
+
+        OUTPUT:
+        errors - (pandas dataframe) a row per number of latent features with:
+                 num_feats - the number of latent features
+                 train_error, test_error - the sum of the absolute differences between
+                                           the matrix and the rounded estimate
+                 train_accuracy, test_accuracy - 1 - the error per cell
+
+        Description:
+        The notebook's evaluation of U_k S_k Vt_k for every k, from one
+        decomposition: the estimate of a block of users is built up one
+        range of latent features at a time, so every k costs one more slice
+        of the factors and the memory stays at block_size x articles.
+        '''
+        self._check_k(num_latent_features)
+        ks = np.sort(np.unique(np.maximum(num_latent_features, 0)))
+        train = self._block_errors(self.user_item_.matrix, np.arange(self.user_item_.shape[0]),
+                                   np.arange(self.user_item_.shape[1]), ks, block_size)
+        n_cells = {'train': self.user_item_.shape[0] * self.user_item_.shape[1]}
+        errors = {'num_feats': ks, 'train_error': train}
+        if user_item_test is not None:
+            users = user_item_test.index.intersection(self.user_item_.index)
+            articles = user_item_test.columns.intersection(self.user_item_.columns)
+            test = user_item_test.matrix[user_item_test.user_rows(users)][:, user_item_test.columns.get_indexer(articles)]
+            errors['test_error'] = self._block_errors(test, self.user_item_.user_rows(users),
+                                                      self.user_item_.columns.get_indexer(articles), ks, block_size)
+            n_cells['test'] = len(users) * len(articles)
+        errors = pd.DataFrame(errors)
+        for name, cells in n_cells.items():
+            errors[name + '_accuracy'] = 1 - errors[name + '_error'] / max(cells, 1)
+        return errors
+
+    def _block_errors(self, actual, rows, cols, ks, block_size):
+        '''the absolute errors of the rounded rank k estimates of actual, rows x cols of the training matrix'''
+        errors = np.zeros(len(ks))
+        vt = self.vt_[:, cols]
+        for start in range(0, len(rows), block_size):
+            block = rows[start:start + block_size]
+            truth = actual[start:start + block_size].toarray()
+            estimate = np.zeros(truth.shape)
+            done = 0
+            for i, k in enumerate(ks):
+                estimate += (self.u_[block, done:k] * self.s_[done:k]) @ vt[done:k]
+                done = k
+                errors[i] += np.abs(truth - np.around(estimate)).sum()
+        return errors
@@ -0,0 +1,173 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+class UserItemMatrix:
+    '''
+    A sparse user-item matrix: users as rows and articles as columns, with a
+    1 where a user interacted with an article.
+
+    The interactions are stored in a scipy.sparse CSR matrix, so memory
+    grows with the number of user-article pairs instead of users x articles.
+    The user and article ids of the rows and columns are kept in sorted
+    pandas Indexes, the same order as the notebook's user_item DataFrame,
+    and the object answers the parts of the DataFrame interface the notebook
+    uses (shape, index, columns, loc[user_id], sum(axis=...)), so it can be
+    passed to get_user_articles in place of the dense frame.
+    '''
+
+    def __init__(self, matrix, user_ids, article_ids):
+        '''
+        INPUT:
+        matrix - (scipy.sparse matrix) users x articles, 1 for an interaction
+        user_ids - (array-like) the user id of each row
+        article_ids - (array-like) the article id of each column
+        '''
+        self.matrix = sparse.csr_matrix(matrix)
+        self.index = pd.Index(user_ids, name='user_id')
+        self.columns = pd.Index(article_ids, name='article_id')
+        self.loc = _UserLocator(self)
+
+    @classmethod
+    def from_interactions(cls, df, user_col='user_id', article_col='article_id'):
+        '''
+        INPUT:
+        df - (pandas dataframe) interactions with user_col and article_col columns
+        user_col - (str) the column of user ids
+        article_col - (str) the column of article ids
+
+        OUTPUT:
+        user_item - (UserItemMatrix) the users by articles matrix
+
+        Description:
+        Factorizes the user and article ids into row and column numbers and
+        builds the CSR matrix from the unique (row, column) pairs in one
+        vectorized pass. Interactions missing either id are dropped, as
+        groupby does.
+        '''
+        rows, user_ids = pd.factorize(df[user_col], sort=True)
+        cols, article_ids = pd.factorize(df[article_col], sort=True)
+        keep = (rows >= 0) & (cols >= 0)
+        # every user-article pair once, sorted by row and then column
+        pairs = np.unique(rows[keep].astype('int64') * len(article_ids) + cols[keep])
+        rows, cols = np.divmod(pairs, len(article_ids))
+        indptr = np.zeros(len(user_ids) + 1, dtype='int64')
+        np.cumsum(np.bincount(rows, minlength=len(user_ids)), out=indptr[1:])
+        matrix = sparse.csr_matrix((np.ones(len(pairs), dtype='uint8'), cols.astype('int32'), indptr),
+                                   shape=(len(user_ids), len(article_ids)))
+        return cls(matrix, user_ids, article_ids)
+
+    @property
+    def shape(self):
+        return self.matrix.shape
+
+    @property
+    def nnz(self):
+        return self.matrix.nnz
+
+    def user_rows(self, user_ids):
+        '''
+        INPUT:
+        user_ids - (int or list) user ids
+
+        OUTPUT:
+        rows - (int or array) the matrix rows of the users, a KeyError is
+               raised for an unknown user
+        '''
+        if np.ndim(user_ids) == 0:
+            return self.index.get_loc(user_ids)
+        rows = self.index.get_indexer(user_ids)
+        if (rows < 0).any():
+            raise KeyError(list(np.asarray(user_ids)[rows < 0]))
+        return rows
+
+    def articles(self, user_id):
+        '''
+        INPUT:
+        user_id - (int) a user id
+
+        OUTPUT:
+        article_ids - (array) the ids of the articles the user interacted with
+        '''
+        row = self.user_rows(user_id)
+        start, end = self.matrix.indptr[row], self.matrix.indptr[row + 1]
+        return self.columns.values[self.matrix.indices[start:end]]
+
+    def sum(self, axis=0):
+        '''
+        INPUT:
+        axis - (int) 0 for the number of users of each article, 1 for the
+               number of articles of each user
+
+        OUTPUT:
+        totals - (pandas series) indexed by article or user id
+        '''
+        if axis in (1, 'columns'):
+            return pd.Series(np.diff(self.matrix.indptr), index=self.index)
+        return pd.Series(np.bincount(self.matrix.indices, minlength=self.shape[1]), index=self.columns)
+
+    def to_frame(self):
+        '''
+        OUTPUT:
+        user_item - (pandas dataframe) the dense 0/1 matrix the notebook's
+                    create_user_item_matrix returns
+        '''
+        return pd.DataFrame(self.matrix.toarray().astype('int64'), index=self.index, columns=self.columns)
+
+    def memory_usage(self):
+        '''
+        OUTPUT:
+        nbytes - (int) bytes held by the sparse matrix and the id indexes
+        '''
+        return (self.matrix.data.nbytes + self.matrix.indices.nbytes + self.matrix.indptr.nbytes
+                + self.index.memory_usage() + self.columns.memory_usage())
+
+    def __repr__(self):
+        return '<UserItemMatrix: {:,} users x {:,} articles, {:,} interactions>'.format(*self.shape, self.nnz)
+
+
+class _UserLocator:
+    '''user_item.loc: rows of a UserItemMatrix by user id, as pandas objects'''
+
+    def __init__(self, user_item):
+        self.user_item = user_item
+
+    def __getitem__(self, user_ids):
+        user_item = self.user_item
+        rows = user_item.user_rows(user_ids)
+        if np.ndim(rows) == 0:
+            return pd.Series(user_item.matrix[rows].toarray().ravel().astype('int64'),
+                             index=user_item.columns, name=user_ids)
+        return pd.DataFrame(user_item.matrix[rows].toarray().astype('int64'),
+                            index=user_item.index[rows], columns=user_item.columns)
+
+
+def create_user_item_matrix(df):
+    '''
+    INPUT:
+    df - pandas dataframe with article_id, title, user_id columns
+
+    OUTPUT:
+    user_item - (UserItemMatrix) user item matrix
+
+    Description:
+    Return a sparse matrix with user ids as rows and article ids on the columns with 1 values where a user
+    interacted with an article and a 0 otherwise
+    '''
+    return UserItemMatrix.from_interactions(df)
+
+
+def get_user_article_ids(user_id, user_item):
+    '''
+    INPUT:
+    user_id - (int) a user id
+    user_item - (UserItemMatrix or pandas dataframe) matrix of users by articles:
+                1's when a user has interacted with an article, 0 otherwise
+
+    OUTPUT:
+    article_ids - (list) a list of the article ids seen by the user
+    '''
+    if isinstance(user_item, UserItemMatrix):
+        return user_item.articles(user_id).tolist()
+    return user_item.loc[user_id][user_item.loc[user_id] == 1].index.values.tolist()
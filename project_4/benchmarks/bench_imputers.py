@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+import warnings
+from functools import partial
+import numpy as np
+import pandas as pd
+from sklearn.impute import KNNImputer, SimpleImputer
+from sklearn.experimental import enable_iterative_imputer  # noqa: F401
+from sklearn.impute import IterativeImputer
+from sklearn.exceptions import ConvergenceWarning
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import pipelines.ml_pipelines as pl
+import pipelines.comparison as cmp
+from pipelines.imputers import FastKNNImputer
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+IMPUTERS = {'KNNImputer': KNNImputer,
+            'fast brute': partial(FastKNNImputer, algorithm='brute'),
+            'fast ball_tree': partial(FastKNNImputer, algorithm='ball_tree'),
+            'median': partial(SimpleImputer, strategy='median'),
+            'iterative': partial(IterativeImputer, random_state=0)}
+SIZES = [1460, 5840, 23360]
+
+
+def rmse(a, b):
+    return np.sqrt(np.mean((a - b)**2))
+
+
+def grow(X, n_rows, seed):
+    '''resample the rows of X with a little noise to make a bigger dataset
+    with the same missingness'''
+    rng = np.random.default_rng(seed)
+    rows = X[rng.integers(0, len(X), n_rows)]
+    return rows + rng.normal(scale=.05, size=rows.shape)
+
+
+def main():
+    '''compare the imputers on the scaled numerical features of train.csv
+    '''
+    warnings.filterwarnings('ignore', category=ConvergenceWarning)
+    df_train = pd.read_csv(os.path.join(DATA_DIR, 'train.csv'), dtype=cmp.DTYPES)
+    X = pl.CustomStandardScaler(cmp.NUM_FEATS_TO_KEEP).fit_transform(df_train)
+    missing = np.isnan(X)
+    print('{:,} rows, {:,} with a missing value, {:,} complete\n'
+          .format(len(X), missing.any(axis=1).sum(), (~missing.any(axis=1)).sum()))
+
+    # hide 5% of the observed values to measure how close each imputer gets to the truth
+    rng = np.random.default_rng(0)
+    hidden = ~missing & (rng.random(X.shape) < .05)
+    X_hidden = np.where(hidden, np.nan, X)
+    reference = KNNImputer().fit_transform(X)
+
+    print('{:<16} {:>18} {:>18}'.format('imputer', 'RMSE vs KNNImputer', 'RMSE hidden values'))
+    for name, imputer in IMPUTERS.items():
+        imputed = imputer().fit_transform(X)
+        truth = imputer().fit_transform(X_hidden)
+        print('{:<16} {:>18.4f} {:>18.4f}'
+              .format(name, rmse(imputed[missing], reference[missing]), rmse(truth[hidden], X[hidden])))
+
+    # the cross-validated RMSE of the models with each imputer
+    print('\n{:<16} {:>10} {:>10} {:>10}'.format('imputer', 'ridge', 'xgbr_best', 'features s'))
+    for name, imputer in IMPUTERS.items():
+        factories = {model: partial(cmp.FACTORIES[model], imputer=imputer())
+                     for model in ['ridge', 'xgbr_best_params']}
+        results = cmp.compare_models(df_train, df_train['LogSalePrice'], cmp.NUM_FEATS_TO_KEEP,
+                                     cmp.CAT_FEATS_TO_ENCODE, factories=factories).set_index('model')
+        print('{:<16} {:>10.4f} {:>10.4f} {:>10.2f}'
+              .format(name, results.loc['ridge', 'rmse'], results.loc['xgbr_best_params', 'rmse'],
+                      results.loc['ridge', 'features_seconds']))
+
+    # fit + transform time as the training data grows
+    print('\n{:<16}'.format('imputer') + ''.join('{:>12,}'.format(n_rows) for n_rows in SIZES))
+    datasets = [grow(X, n_rows, seed) for seed, n_rows in enumerate(SIZES)]
+    for name, imputer in IMPUTERS.items():
+        times = []
+        for data in datasets:
+            start = time.perf_counter()
+            imputer().fit_transform(data)
+            times.append(time.perf_counter() - start)
+        print('{:<16}'.format(name) + ''.join('{:>11.2f}s'.format(seconds) for seconds in times))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.preprocessing import StandardScaler, OneHotEncoder
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import pipelines.ml_pipelines as pl
+import pipelines.comparison as cmp
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+DTYPES = cmp.DTYPES
+CAT_FEATS = cmp.CAT_FEATS_TO_ENCODE
+NUM_FEATS = cmp.NUM_FEATS_TO_KEEP
+FACTORIES = list(cmp.FACTORIES.values())
+
+
+class LegacyEncoder(BaseEstimator, TransformerMixin):
+    '''the original CustomEncoder, refitted on every transform'''
+    def __init__(self, feats):
+        self.feats = feats
+
+    def fit(self, X, y=None):
+        return self
+
+    def transform(self, X, y=None):
+        encoder = OneHotEncoder(drop='first', handle_unknown='error')
+        return encoder.fit_transform(X[self.feats]).toarray()
+
+
+class LegacyStandardScaler(BaseEstimator, TransformerMixin):
+    '''the original CustomStandardScaler, refitted on every transform'''
+    def __init__(self, feats):
+        self.feats = feats
+
+    def fit(self, X, y=None):
+        return self
+
+    def transform(self, X, y=None):
+        return StandardScaler().fit_transform(X[self.feats])
+
+
+def legacy(pipeline):
+    return pipeline.set_params(features__PCA_pipeline__StandardScaler=LegacyStandardScaler(NUM_FEATS),
+                               features__factor_encoder=LegacyEncoder(CAT_FEATS))
+
+
+def time_predict(pipeline, X, repeat):
+    '''the median seconds of pipeline.predict(X), or None if it fails'''
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            pipeline.predict(X)
+        except ValueError:
+            return None
+        times.append(time.perf_counter() - start)
+    return np.median(times)
+
+
+def main():
+    '''time predict on test.csv with the original and the fit-once transformers
+    '''
+    df_train = pd.read_csv(os.path.join(DATA_DIR, 'train.csv'), dtype=DTYPES)
+    df_test = pd.read_csv(os.path.join(DATA_DIR, 'test.csv'), dtype=DTYPES)
+
+    # the transformers alone, on the whole test set
+    for name, old, new in [('encoder', LegacyEncoder(CAT_FEATS), pl.CustomEncoder(CAT_FEATS)),
+                           ('scaler', LegacyStandardScaler(NUM_FEATS), pl.CustomStandardScaler(NUM_FEATS))]:
+        # on the data they are fitted on both give the same matrix
+        np.testing.assert_allclose(old.fit_transform(df_train), new.fit_transform(df_train), atol=1e-12)
+        start = time.perf_counter()
+        for _ in range(100):
+            old.transform(df_test)
+        old_time = (time.perf_counter() - start) / 100
+        start = time.perf_counter()
+        for _ in range(100):
+            new.transform(df_test)
+        new_time = (time.perf_counter() - start) / 100
+        print('{:<8} transform: {:.2f} ms -> {:.2f} ms'.format(name, 1000 * old_time, 1000 * new_time))
+
+    print('\n{:<26} {:>13} {:>13} {:>13} {:>13} {:>14}'
+          .format('pipeline', 'original (ms)', 'fit-once (ms)', '1 row orig.', '1 row fit-once',
+                  'max test diff'))
+    one_row = df_test.iloc[[0]]
+    for factory in FACTORIES:
+        old = legacy(factory(NUM_FEATS, CAT_FEATS)).fit(df_train, df_train['LogSalePrice'])
+        new = factory(NUM_FEATS, CAT_FEATS).fit(df_train, df_train['LogSalePrice'])
+        # identical on the training data, the original leaks the test set's own
+        # means and levels into its test predictions
+        np.testing.assert_allclose(old.predict(df_train), new.predict(df_train), rtol=1e-6)
+        difference = np.abs(old.predict(df_test) - new.predict(df_test)).max()
+
+        old_time, new_time = time_predict(old, df_test, 20), time_predict(new, df_test, 20)
+        old_row, new_row = time_predict(old, one_row, 50), time_predict(new, one_row, 50)
+        print('{:<26} {:>13.2f} {:>13.2f} {:>13} {:>14.2f} {:>14.4f}'
+              .format(factory.__name__, 1000 * old_time, 1000 * new_time,
+                      'fails' if old_row is None else '{:.2f}'.format(1000 * old_row),
+                      1000 * new_row, difference))
+
+
+if __name__ == '__main__':
+    main()
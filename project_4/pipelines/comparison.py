@@ -0,0 +1,148 @@
+import time
+import argparse
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.model_selection import KFold, ParameterGrid
+
+from . import ml_pipelines as pl
+
+"""The models compared in modeling.ipynb, by name"""
+FACTORIES = {'xgbr': pl.pipeline_xgbr,
+             'xgbr_best_params': pl.pipeline_xgbr_best_params,
+             'knn': pl.pipeline_knn,
+             'ridge': pl.pipeline_ridge,
+             'lm': pl.pipeline_lm}
+
+"""The hyperparameter grids of modeling.ipynb, by model name"""
+PARAM_GRIDS = {'xgbr': {'max_depth': [5, 7, 10], 'n_estimators': [20, 50, 100]},
+               'knn': {'n_neighbors': [1, 5, 10, 15, 20, 25]},
+               'ridge': {'alpha': [0.0001, 0.001, 0.01, 0.1, 1, 10]}}
+
+"""The dtypes and features of modeling.ipynb"""
+DTYPES = {'LotFrontage': 'double', 'LoArea': 'double',
+          'MasVnrArea': 'double', 'BsmtFinSF1': 'double',
+          'BsmtFinSF2': 'double', 'HeatingQC': 'category',
+          'ExterQual': 'category', 'KitchenQual': 'category',
+          'LotShape': 'category', 'OverallQual': 'category',
+          'OverallCond': 'category', 'MSZoning': 'category'}
+CAT_FEATS_TO_ENCODE = ['MSZoning', 'OverallQual', 'NeighborhoodQuality', 'ExterQual', 'KitchenQual',
+                       'BsmtQual']
+NUM_FEATS_TO_KEEP = ['LotFrontage', 'LotArea', 'YearBuilt', 'YearRemodAdd', 'MasVnrArea', 'BsmtFinSF1',
+                     'TotalBsmtSF', '1stFlrSF', '2ndFlrSF', 'GrLivArea', 'FullBath', 'TotRmsAbvGrd',
+                     'Fireplaces', 'GarageYrBlt', 'GarageCars', 'GarageArea', 'WoodDeckSF', 'EnclosedPorch']
+
+
+"""Fit a feature block on a training fold and transform both sides
+
+Positional Arguments:
+    features - an unfitted feature block, e.g. the 'features' FeatureUnion
+    X_train - the rows to fit on
+    X_test - the rows to score on
+
+Returns:
+    the train and test matrices and the seconds taken
+"""
+def fit_features(features, X_train, X_test):
+    start = time.perf_counter()
+    features = clone(features)
+    train = features.fit_transform(X_train)
+    test = features.transform(X_test)
+    return train, test, time.perf_counter() - start
+
+
+"""Cross-validate the heads of several pipelines on shared, cached features
+
+The pipelines built by the factories are split into their feature block
+(every step but the last) and their head estimator. Pipelines with the
+same feature block share it: it is fitted once per fold, e.g. the
+scaler, KNN imputation and PCA, and every head and every candidate in
+its parameter grid is fitted on the cached matrices. The folds are
+those of GridSearchCV(cv=5), so the scores are the ones it reports.
+
+Positional Arguments:
+    X - model matrix of predictors
+    y - the response
+    num_feats - numerical features passed to the factories
+    cat_feats - categorical features passed to the factories
+
+Keyword Arguments:
+    factories - dictionary of names to pipeline factories
+    param_grids - dictionary of names to grids of the head's parameters
+    cv - the number of folds or a scikit-learn splitter
+
+Returns:
+    a DataFrame with a row per model and parameters: the RMSE over the
+    folds (the square root of the mean squared error), the standard
+    deviation of the folds' RMSE, the seconds spent fitting and
+    predicting the head and the seconds its feature block took
+"""
+def compare_models(X, y, num_feats, cat_feats, factories=FACTORIES, param_grids=None, cv=5):
+    param_grids = param_grids or {}
+    splitter = KFold(cv) if isinstance(cv, int) else cv
+    folds = list(splitter.split(X, y))
+    y = np.asarray(y)
+
+    pipelines = {name: factory(num_feats, cat_feats) for name, factory in factories.items()}
+    blocks = {}
+    for name, pipeline in pipelines.items():
+        features = pipeline[:-1]
+        blocks.setdefault(joblib.hash(features), features)
+
+    # every feature block is fitted once per fold
+    cached = {key: [fit_features(features, X.iloc[train], X.iloc[test]) for train, test in folds]
+              for key, features in blocks.items()}
+
+    rows = []
+    for name, pipeline in pipelines.items():
+        key = joblib.hash(pipeline[:-1])
+        head = pipeline.steps[-1][1]
+        for params in ParameterGrid(param_grids.get(name, {})):
+            errors, fit_seconds, predict_seconds = [], 0., 0.
+            for (train, test), (X_train, X_test, _) in zip(folds, cached[key]):
+                estimator = clone(head).set_params(**params)
+                start = time.perf_counter()
+                estimator.fit(X_train, y[train])
+                fit_seconds += time.perf_counter() - start
+                start = time.perf_counter()
+                predictions = estimator.predict(X_test)
+                predict_seconds += time.perf_counter() - start
+                errors.append(np.mean((y[test] - predictions)**2))
+            rows.append({'model': name, 'params': params,
+                         'rmse': np.sqrt(np.mean(errors)),
+                         'rmse_std': np.std(np.sqrt(errors)),
+                         'fit_seconds': fit_seconds,
+                         'predict_seconds': predict_seconds,
+                         'features_seconds': sum(seconds for _, _, seconds in cached[key])})
+    return pd.DataFrame(rows)
+
+
+"""Parse the command line arguments of the comparison runner"""
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description='Cross-validate the ml_pipelines models on shared features.')
+    parser.add_argument('train_filepath', nargs='?', default='train.csv', help='path to train.csv')
+    parser.add_argument('--target', default='LogSalePrice', help='the response variable')
+    parser.add_argument('--cv', type=int, default=5, help='number of folds')
+    parser.add_argument('--grids', action='store_true', help="search the modeling.ipynb hyperparameter grids")
+    return parser.parse_args(args)
+
+
+def main():
+    args = parse_args()
+    df_train = pd.read_csv(args.train_filepath, dtype=DTYPES)
+    start = time.perf_counter()
+    results = compare_models(df_train, df_train[args.target], NUM_FEATS_TO_KEEP, CAT_FEATS_TO_ENCODE,
+                             param_grids=PARAM_GRIDS if args.grids else None, cv=args.cv)
+    seconds = time.perf_counter() - start
+
+    with pd.option_context('display.width', 200, 'display.max_colwidth', 40):
+        print(results.sort_values('rmse').to_string(index=False, float_format='{:.4f}'.format))
+    # without the cache every candidate refits its feature block on every fold
+    uncached = results['features_seconds'].sum() + results['fit_seconds'].sum() + results['predict_seconds'].sum()
+    print('\n{} candidates x {} folds in {:.1f}s, about {:.1f}s refitting the features for each'
+          .format(len(results), args.cv, seconds, uncached))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+# Imports
+import numpy as np
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.neighbors import NearestNeighbors
+from sklearn.impute import SimpleImputer
+from sklearn.experimental import enable_iterative_imputer  # noqa: F401
+from sklearn.impute import IterativeImputer
+
+ALGORITHMS = ('brute', 'ball_tree', 'kd_tree')
+FALLBACKS = ('median', 'iterative')
+
+"""Impute missing values with the mean of the nearest complete rows
+
+An approximate, faster KNNImputer. The donors are the rows of the
+training data without any missing value. Rows to impute are grouped by
+which features they are missing, so within a group the neighbors are
+found with plain euclidean distances over the features the group does
+have (the ordering KNNImputer's nan_euclidean distance gives for
+complete donors). The neighbors are searched either by brute force, a
+block of rows at a time so memory stays at block_size x donors, or with
+a ball/kd tree per group built once and reused.
+
+Rows missing every feature, or training data with fewer than
+n_neighbors complete rows, are imputed by the fallback: the medians or
+an IterativeImputer.
+
+Inherits: BaseEstimator, TransformerMixin
+"""
+class FastKNNImputer(BaseEstimator, TransformerMixin):
+
+    """Constructor for FastKNNImputer
+
+    Keyword Arguments:
+        n_neighbors: number of complete rows to average
+        algorithm: 'brute', 'ball_tree' or 'kd_tree'
+        block_size: rows imputed at a time by the brute force search
+        fallback: 'median' or 'iterative'
+    """
+    def __init__(self, n_neighbors=5, algorithm='brute', block_size=1024, fallback='median'):
+        self.n_neighbors = n_neighbors
+        self.algorithm = algorithm
+        self.block_size = block_size
+        self.fallback = fallback
+
+    """fit data to this transformer, keeping the complete rows as donors
+
+    Positional Arguments:
+        X - matrix of numerical features, with missing values as NaN
+    """
+    def fit(self, X, y=None):
+        if self.algorithm not in ALGORITHMS:
+            raise ValueError('algorithm must be one of {}'.format(ALGORITHMS))
+        if self.fallback not in FALLBACKS:
+            raise ValueError('fallback must be one of {}'.format(FALLBACKS))
+        X = np.asarray(X, dtype='double')
+        self.donors_ = X[~np.isnan(X).any(axis=1)]
+        if self.fallback == 'median':
+            self.fallback_ = SimpleImputer(strategy='median').fit(X)
+        else:
+            self.fallback_ = IterativeImputer(random_state=0).fit(X)
+        # neighbor searches over the donors' columns, built once per missingness pattern
+        self._searches = {}
+        return self
+
+    """transform data by imputing every missing value
+
+    Positional Arguments:
+        X - matrix of numerical features, with missing values as NaN
+    """
+    def transform(self, X, y=None):
+        X = np.array(X, dtype='double')
+        missing = np.isnan(X)
+        rows = np.flatnonzero(missing.any(axis=1))
+        if not len(rows):
+            return X
+        if len(self.donors_) < self.n_neighbors:
+            return self.fallback_.transform(X)
+
+        patterns, groups = np.unique(missing[rows], axis=0, return_inverse=True)
+        groups = groups.reshape(-1)
+        fallback_rows = []
+        for group, pattern in enumerate(patterns):
+            group_rows = rows[groups == group]
+            observed = ~pattern
+            if not observed.any():
+                fallback_rows.append(group_rows)
+                continue
+            for start in range(0, len(group_rows), self.block_size):
+                block = group_rows[start:start + self.block_size]
+                neighbors = self._kneighbors(X[np.ix_(block, observed)], observed)
+                X[np.ix_(block, pattern)] = self.donors_[:, pattern][neighbors].mean(axis=1)
+
+        if fallback_rows:
+            fallback_rows = np.concatenate(fallback_rows)
+            X[fallback_rows] = self.fallback_.transform(X[fallback_rows])
+        return X
+
+    """the indices of the n_neighbors donors nearest to each query row
+
+    Positional Arguments:
+        queries - rows restricted to their observed features
+        observed - boolean mask of the observed features
+    """
+    def _kneighbors(self, queries, observed):
+        donors = self.donors_[:, observed]
+        if self.algorithm != 'brute':
+            key = observed.tobytes()
+            if key not in self._searches:
+                self._searches[key] = NearestNeighbors(n_neighbors=self.n_neighbors,
+                                                       algorithm=self.algorithm).fit(donors)
+            return self._searches[key].kneighbors(queries, return_distance=False)
+
+        # squared euclidean distances of the block, |q|^2 - 2 q.d + |d|^2
+        distances = (queries**2).sum(axis=1)[:, None] - 2 * queries @ donors.T + (donors**2).sum(axis=1)
+        if self.n_neighbors < len(donors):
+            return np.argpartition(distances, self.n_neighbors - 1, axis=1)[:, :self.n_neighbors]
+        return np.broadcast_to(np.arange(len(donors)), distances.shape)
@@ -1,16 +1,26 @@
 # Imports
+import os
+import json
+import numpy as np
+import pandas as pd
+from scipy import sparse
 from sklearn.pipeline import Pipeline
 from sklearn.decomposition import PCA
 from sklearn.impute import KNNImputer
 from xgboost import XGBRegressor
 from sklearn.pipeline import FeatureUnion
 from sklearn.base import BaseEstimator, TransformerMixin
-from sklearn.preprocessing import StandardScaler, OneHotEncoder
 from sklearn.neighbors import KNeighborsRegressor
 from sklearn.linear_model import Ridge, LinearRegression
 
 """Apply treatment coding to categorical variables
 
+Learns the levels of every feature in fit, like
+OneHotEncoder(drop='first'), and encodes new data with them so the
+columns at predict time are the columns the model was trained on.
+Levels not seen in fit are encoded as all zeros, the same as the
+dropped first level.
+
 Inherits: BaseEstimator, TransformerMixin
 """
 class CustomEncoder(BaseEstimator, TransformerMixin):
@@ -19,16 +29,31 @@ class CustomEncoder(BaseEstimator, TransformerMixin):
     
     Positional Arguments:
         feats: a list of categorical variables to encode
+
+    Keyword Arguments:
+        sparse: return a scipy.sparse CSR matrix instead of a numpy array
     """
-    def __init__(self, feats):
+    def __init__(self, feats, sparse=False):
         self.feats = feats
+        self.sparse = sparse
     
-    """fit data to this transformer
+    """fit data to this transformer, learning the sorted levels of each
+    feature (missing values last) and the column each one starts at
 
     Positional Arguments:
         X - model matrix of predictors
     """
     def fit(self, X, y=None):
+        self.categories_ = []
+        for feat in self.feats:
+            values = X[feat].to_numpy(dtype='object')
+            missing = pd.isna(values)
+            levels = np.array(sorted(set(values[~missing])), dtype='object')
+            if missing.any():
+                levels = np.append(levels, np.nan)
+            self.categories_.append(levels)
+        # the first level of every feature is dropped
+        self.offsets_ = np.cumsum([0] + [len(levels) - 1 for levels in self.categories_])
         return self
     
     """transform data using treatment coding
@@ -37,12 +62,24 @@ class CustomEncoder(BaseEstimator, TransformerMixin):
         X - model matrix of predictors
     """
     def transform(self, X, y=None):
-        encoder = OneHotEncoder(drop='first', handle_unknown='error')
-        return encoder.fit_transform(X[self.feats]).toarray()
+        codes = np.empty((len(X), len(self.feats)), dtype=np.int64)
+        for i, (feat, levels) in enumerate(zip(self.feats, self.categories_)):
+            # a hash lookup of every value, missing values included
+            codes[:, i] = pd.Index(levels).get_indexer(X[feat])
+        # code 0 is the dropped level and -1 a level not seen in fit
+        rows, feats = np.nonzero(codes > 0)
+        columns = self.offsets_[feats] + codes[rows, feats] - 1
+        encoded = sparse.csr_matrix((np.ones(len(rows)), (rows, columns)),
+                                    shape=(len(X), self.offsets_[-1]))
+        return encoded if self.sparse else encoded.toarray()
 
 
     """Apply standardization to numerical features
 
+    Learns the mean and standard deviation of every feature in fit,
+    ignoring missing values like StandardScaler, and applies them to new
+    data. Missing values are kept for the imputer.
+
     Inherits: BaseEstimator, TransformerMixin
     """
 class CustomStandardScaler(BaseEstimator, TransformerMixin):
@@ -56,12 +93,17 @@ class CustomStandardScaler(BaseEstimator, TransformerMixin):
         self.feats = feats
         
 
-    """fit data to this transformer
+    """fit data to this transformer, learning the mean and scale of each feature
 
     Positional Arguments:
         X - model matrix of predictors
     """
     def fit(self, X, y=None):
+        values = X[self.feats].to_numpy(dtype='double')
+        self.mean_ = np.nanmean(values, axis=0)
+        self.scale_ = np.nanstd(values, axis=0)
+        # constant features are only centered
+        self.scale_[self.scale_ == 0] = 1.
         return self
     
     """transform data using centering and scaling
@@ -70,25 +112,40 @@ class CustomStandardScaler(BaseEstimator, TransformerMixin):
         X - model matrix of predictors
     """
     def transform(self, X, y=None):
-        scaler = StandardScaler()
-        return scaler.fit_transform(X[self.feats])
+        return (X[self.feats].to_numpy(dtype='double') - self.mean_) / self.scale_
+
+"""The hyperparameters written by pipelines.search, by model name"""
+BEST_PARAMS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'best_params.json')
+
+"""Load the best hyperparameters found for a model
+
+Positional Arguments:
+    model - the name of the model, e.g. 'xgbr'
+
+Keyword Arguments:
+    path - the JSON file of best hyperparameters
+"""
+def load_best_params(model, path=BEST_PARAMS_PATH):
+    with open(path) as f:
+        return json.load(f).get(model, {})
 
     """pipeline_xgbr: ML pipeline with the following steps
 
        1. Numerical feature transformations
            1a. Apply standardization
-           1b. Apply KNN imputer to missing data
+           1b. Apply KNN imputer to missing data (or the imputer passed in,
+               e.g. imputers.FastKNNImputer)
            1c. Calculate 8 principal components
 
        2. Apply treatment coding to the categorical features
        3. Fit XGBoost to the combined results of (2) and (3)
     """
-def pipeline_xgbr(num_feats_to_keep, cat_feats_to_encode):
+def pipeline_xgbr(num_feats_to_keep, cat_feats_to_encode, imputer=None):
     pipelinexgb = Pipeline([
            ('features', FeatureUnion([
                ('PCA_pipeline', Pipeline([
                     ('StandardScaler', CustomStandardScaler(num_feats_to_keep)),
-                    ('Imputer', KNNImputer()),
+                    ('Imputer', imputer if imputer is not None else KNNImputer()),
                     ('PCA', PCA(n_components=8))
                 ])),
                 ('factor_encoder', CustomEncoder(cat_feats_to_encode))
@@ -101,25 +158,27 @@ def pipeline_xgbr(num_feats_to_keep, cat_feats_to_encode):
 
        1. Numerical feature transformations
            1a. Apply standardization
-           1b. Apply KNN imputer to missing data
+           1b. Apply KNN imputer to missing data (or the imputer passed in,
+               e.g. imputers.FastKNNImputer)
            1c. Calculate 8 principal components
 
        2. Apply treatment coding to the categorical features
-       3. Fit XGBoost to the combined results of (2) and (3)
+       3. Fit XGBoost, with the hyperparameters in best_params.json (or
+          the best_params passed in), to the combined results of (2) and (3)
     """
-def pipeline_xgbr_best_params(num_feats_to_keep, cat_feats_to_encode):
+def pipeline_xgbr_best_params(num_feats_to_keep, cat_feats_to_encode, imputer=None, best_params=None):
+    if best_params is None:
+        best_params = load_best_params('xgbr')
     pipelinexgb = Pipeline([
            ('features', FeatureUnion([
                ('PCA_pipeline', Pipeline([
                     ('StandardScaler', CustomStandardScaler(num_feats_to_keep)),
-                    ('Imputer', KNNImputer()),
+                    ('Imputer', imputer if imputer is not None else KNNImputer()),
                     ('PCA', PCA(n_components=8))
                 ])),
                 ('factor_encoder', CustomEncoder(cat_feats_to_encode))
             ])),
-            ('xgbr', XGBRegressor(random_state=123,
-                                  max_depth=5,
-                                  n_estimators=20))
+            ('xgbr', XGBRegressor(random_state=123, **best_params))
         ])
     return pipelinexgb
 
@@ -127,18 +186,19 @@ def pipeline_xgbr_best_params(num_feats_to_keep, cat_feats_to_encode):
 
        1. Numerical feature transformations
            1a. Apply standardization
-           1b. Apply KNN imputer to missing data
+           1b. Apply KNN imputer to missing data (or the imputer passed in,
+               e.g. imputers.FastKNNImputer)
            1c. Calculate 8 principal components
 
        2. Apply treatment coding to the categorical features
        3. Fit XGBoost to the combined results of (2) and (3)
     """
-def pipeline_knn(num_feats_to_keep, cat_feats_to_encode):
+def pipeline_knn(num_feats_to_keep, cat_feats_to_encode, imputer=None):
     pipelineknn = Pipeline([
         ('features', FeatureUnion([
            ('PCA_pipeline', Pipeline([
                 ('StandardScaler', CustomStandardScaler(num_feats_to_keep)),
-                ('Imputer', KNNImputer()),
+                ('Imputer', imputer if imputer is not None else KNNImputer()),
                 ('PCA', PCA(n_components=8))
             ])),
             ('factor_encoder', CustomEncoder(cat_feats_to_encode))
@@ -151,18 +211,19 @@ def pipeline_knn(num_feats_to_keep, cat_feats_to_encode):
 
        1. Numerical feature transformations
            1a. Apply standardization
-           1b. Apply KNN imputer to missing data
+           1b. Apply KNN imputer to missing data (or the imputer passed in,
+               e.g. imputers.FastKNNImputer)
            1c. Calculate 8 principal components
 
        2. Apply treatment coding to the categorical features
        3. Fit XGBoost to the combined results of (2) and (3)
     """
-def pipeline_ridge(num_feats_to_keep, cat_feats_to_encode):
+def pipeline_ridge(num_feats_to_keep, cat_feats_to_encode, imputer=None):
     pipelineridge = Pipeline([
         ('features', FeatureUnion([
            ('PCA_pipeline', Pipeline([
                 ('StandardScaler', CustomStandardScaler(num_feats_to_keep)),
-                ('Imputer', KNNImputer()),
+                ('Imputer', imputer if imputer is not None else KNNImputer()),
                 ('PCA', PCA(n_components=8))
             ])),
             ('factor_encoder', CustomEncoder(cat_feats_to_encode))
@@ -175,18 +236,19 @@ def pipeline_ridge(num_feats_to_keep, cat_feats_to_encode):
 
        1. Numerical feature transformations
            1a. Apply standardization
-           1b. Apply KNN imputer to missing data
+           1b. Apply KNN imputer to missing data (or the imputer passed in,
+               e.g. imputers.FastKNNImputer)
            1c. Calculate 8 principal components
 
        2. Apply treatment coding to the categorical features
        3. Fit XGBoost to the combined results of (2) and (3)
     """
-def pipeline_lm(num_feats_to_keep, cat_feats_to_encode):
+def pipeline_lm(num_feats_to_keep, cat_feats_to_encode, imputer=None):
     pipelinelm = Pipeline([
         ('features', FeatureUnion([
            ('PCA_pipeline', Pipeline([
                 ('StandardScaler', CustomStandardScaler(num_feats_to_keep)),
-                ('Imputer', KNNImputer()),
+                ('Imputer', imputer if imputer is not None else KNNImputer()),
                 ('PCA', PCA(n_components=8))
             ])),
             ('factor_encoder', CustomEncoder(cat_feats_to_encode))
@@ -0,0 +1,286 @@
+import os
+import json
+import math
+import hashlib
+import time
+import argparse
+from multiprocessing import Pool
+import numpy as np
+import pandas as pd
+from scipy.stats import randint, uniform
+try:
+    from scipy.stats import loguniform
+except ImportError:
+    # scipy < 1.4 (requirements.txt pins 1.3.1), scikit-learn 0.23 ships a copy
+    from sklearn.utils.fixes import loguniform
+from sklearn.base import clone
+from sklearn.model_selection import KFold, ParameterSampler
+
+from . import ml_pipelines as pl
+from .comparison import FACTORIES, DTYPES, NUM_FEATS_TO_KEEP, CAT_FEATS_TO_ENCODE, fit_features
+
+"""The hyperparameter distributions searched for each model, only models
+whose pipeline factory loads the parameters written to best_params.json"""
+SEARCH_SPACES = {'xgbr': {'max_depth': randint(2, 11),
+                          'learning_rate': loguniform(0.01, 0.3),
+                          'subsample': uniform(0.6, 0.4),
+                          'colsample_bytree': uniform(0.5, 0.5),
+                          'min_child_weight': randint(1, 11)}}
+METHODS = ('halving', 'random')
+
+
+"""Turn numpy scalars into Python ones so parameters can be written as JSON"""
+def to_python(params):
+    return {name: value.item() if isinstance(value, np.generic) else value
+            for name, value in params.items()}
+
+
+"""the key of a candidate evaluated on n_rows rows by the search configuration
+with the given fingerprint in the results file"""
+def result_key(model, params, n_rows, fingerprint):
+    return json.dumps([model, params, n_rows, fingerprint], sort_keys=True)
+
+
+"""A hash of everything besides the candidate and its rows that changes a
+score: the data, the response, the features, the folds and the fitting
+settings, so a results file is only resumed by the same search
+
+Positional Arguments:
+    X - model matrix of predictors
+    y - the response
+    settings - a JSON serializable dictionary of the other settings
+"""
+def search_fingerprint(X, y, settings):
+    data = pd.util.hash_pandas_object(X, index=True).to_numpy()
+    response = pd.util.hash_pandas_object(pd.Series(np.asarray(y)), index=False).to_numpy()
+    digest = hashlib.sha256(data.tobytes())
+    digest.update(response.tobytes())
+    digest.update(json.dumps(settings, sort_keys=True).encode())
+    return digest.hexdigest()[:16]
+
+
+"""Load the candidates already evaluated by an earlier (maybe interrupted) run
+
+Positional Arguments:
+    results_path - the JSON lines file the results are appended to
+"""
+def load_results(results_path):
+    results = {}
+    if os.path.exists(results_path):
+        with open(results_path) as f:
+            for line in f:
+                # a line cut short by an interruption is evaluated again
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue
+                results[result_key(row['model'], row['params'], row['n_rows'], row.get('fingerprint'))] = row
+    return results
+
+
+"""the rows of training data each successive halving round uses, the last
+round using all of them"""
+def halving_schedule(n_candidates, max_rows, factor, min_rows):
+    n_rounds = int(math.log(n_candidates, factor)) + 1 if n_candidates > 1 else 1
+    rows = [int(max_rows / factor**(n_rounds - 1 - i)) for i in range(n_rounds)]
+    return [n_rows for n_rows in rows if n_rows >= min_rows] or [max_rows]
+
+
+# each pool worker keeps the cached fold matrices for all of its tasks
+_worker_folds = None
+
+
+def _init_worker(folds):
+    global _worker_folds
+    _worker_folds = folds
+
+
+"""Cross-validate one candidate on the first n_rows rows of every fold
+
+XGBRegressor heads stop early on the last tenth of those rows and report
+the number of trees kept.
+"""
+def _evaluate(task):
+    model, head, params, n_rows, early_stopping_rounds, fingerprint = task
+    errors, best_iterations = [], []
+    start = time.perf_counter()
+    for X_train, X_test, y_train, y_test in _worker_folds:
+        estimator = clone(head).set_params(**params)
+        X_train, y_train = X_train[:n_rows], y_train[:n_rows]
+        if early_stopping_rounds:
+            n_fit = int(.9 * len(y_train))
+            estimator.set_params(early_stopping_rounds=early_stopping_rounds)
+            estimator.fit(X_train[:n_fit], y_train[:n_fit],
+                          eval_set=[(X_train[n_fit:], y_train[n_fit:])], verbose=False)
+            best_iterations.append(estimator.best_iteration + 1)
+        else:
+            estimator.fit(X_train, y_train)
+        errors.append(np.mean((y_test - estimator.predict(X_test))**2))
+    return {'model': model, 'params': params, 'n_rows': n_rows, 'fingerprint': fingerprint,
+            'rmse': float(np.sqrt(np.mean(errors))), 'rmse_std': float(np.std(np.sqrt(errors))),
+            'seconds': time.perf_counter() - start,
+            'best_iteration': int(round(np.mean(best_iterations))) if best_iterations else None}
+
+
+"""Search the hyperparameters of one of the ml_pipelines models
+
+The feature block of the model's pipeline is fitted once per fold, as in
+comparison.compare_models, and candidates drawn from the search space
+are cross-validated on the cached matrices across a process pool. With
+method='halving' every round keeps the best 1/factor of the candidates
+and gives them factor times more training rows, so only the promising
+candidates are fitted on all of the data; method='random' fits every
+candidate on all of it. XGBRegressor candidates use tree_method='hist'
+and early stopping, with up to max_estimators trees.
+
+Every evaluation is appended to results_path as soon as it finishes and
+the candidates are drawn from random_state, so running the same search
+again skips everything an interrupted run already did. Results are keyed
+by a fingerprint of the data, the response, the features, the folds, the
+seed and the XGBoost settings, so a search with any of them changed
+evaluates its candidates again instead of reusing stale scores.
+
+Positional Arguments:
+    X - model matrix of predictors
+    y - the response
+    num_feats - numerical features passed to the factory
+    cat_feats - categorical features passed to the factory
+
+Keyword Arguments:
+    model - a name in comparison.FACTORIES with a search space
+    n_candidates - the number of candidates to draw
+    method - 'halving' or 'random'
+    factor - the fraction of candidates (1/factor) kept after each round
+    min_rows - the fewest training rows a halving round uses
+    cv - the number of folds
+    n_jobs - number of processes, None uses every core
+    xgb_n_jobs - threads of each XGBRegressor
+    early_stopping_rounds - rounds without improvement before XGBoost stops
+    max_estimators - the most trees an XGBRegressor may grow
+    results_path - the JSON lines file results are kept in
+    search_spaces - dictionary of model names to parameter distributions
+    random_state - seed for drawing the candidates and shuffling the folds
+
+Returns:
+    a DataFrame of every evaluation of this search and the best parameters
+"""
+def search(X, y, num_feats, cat_feats, model='xgbr', n_candidates=27, method='halving', factor=3,
+           min_rows=100, cv=5, n_jobs=None, xgb_n_jobs=1, early_stopping_rounds=20, max_estimators=1000,
+           results_path='search_results.jsonl', search_spaces=SEARCH_SPACES, random_state=0):
+    if method not in METHODS:
+        raise ValueError('method must be one of {}'.format(METHODS))
+    pipeline = FACTORIES[model](num_feats, cat_feats)
+    head = pipeline.steps[-1][1]
+    is_xgb = head.__class__.__name__ == 'XGBRegressor'
+    if is_xgb:
+        head = clone(head).set_params(n_estimators=max_estimators, tree_method='hist', n_jobs=xgb_n_jobs)
+
+    # the features of every fold, with the training rows shuffled so the
+    # first n_rows of them are a random sample
+    rng = np.random.RandomState(random_state)
+    y = np.asarray(y)
+    folds = []
+    for train, test in KFold(cv).split(X):
+        train = rng.permutation(train)
+        X_train, X_test, _ = fit_features(pipeline[:-1], X.iloc[train], X.iloc[test])
+        folds.append((X_train, X_test, y[train], y[test]))
+
+    candidates = [to_python(params) for params in
+                  ParameterSampler(search_spaces[model], n_candidates, random_state=random_state)]
+    max_rows = min(len(fold[2]) for fold in folds)
+    schedule = halving_schedule(len(candidates), max_rows, factor, min_rows) if method == 'halving' else [max_rows]
+
+    fingerprint = search_fingerprint(X, y, {'model': model, 'num_feats': list(num_feats),
+                                            'cat_feats': list(cat_feats), 'cv': cv,
+                                            'random_state': random_state,
+                                            'early_stopping_rounds': early_stopping_rounds if is_xgb else None,
+                                            'max_estimators': max_estimators if is_xgb else None,
+                                            'head': repr({name: value for name, value in head.get_params().items()
+                                                          if name != 'n_jobs'})})
+    results = load_results(results_path)
+    rows = []
+    n_jobs = n_jobs or os.cpu_count()
+    pool = Pool(n_jobs, initializer=_init_worker, initargs=(folds,)) if n_jobs > 1 else None
+    if pool is None:
+        _init_worker(folds)
+    try:
+        for i, n_rows in enumerate(schedule):
+            tasks = [(model, head, params, n_rows, early_stopping_rounds if is_xgb else None, fingerprint)
+                     for params in candidates if result_key(model, params, n_rows, fingerprint) not in results]
+            evaluated = pool.imap_unordered(_evaluate, tasks) if pool else map(_evaluate, tasks)
+            with open(results_path, 'a') as f:
+                for row in evaluated:
+                    f.write(json.dumps(row) + '\n')
+                    f.flush()
+                    results[result_key(model, row['params'], n_rows, fingerprint)] = row
+
+            scored = sorted((results[result_key(model, params, n_rows, fingerprint)] for params in candidates),
+                            key=lambda row: row['rmse'])
+            rows.extend(dict(row, round=i) for row in scored)
+            if i < len(schedule) - 1:
+                candidates = [row['params'] for row in scored[:max(1, math.ceil(len(scored) / factor))]]
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    best = scored[0]
+    best_params = dict(best['params'])
+    if is_xgb:
+        # refit on all the data with the number of trees early stopping kept
+        best_params.update(n_estimators=best['best_iteration'], tree_method='hist')
+    return pd.DataFrame(rows), best_params
+
+
+"""Write a model's best hyperparameters to the JSON file the factories load
+
+Positional Arguments:
+    model - the name of the model
+    best_params - the hyperparameters
+
+Keyword Arguments:
+    path - the JSON file, other models' parameters in it are kept
+"""
+def write_best_params(model, best_params, path=pl.BEST_PARAMS_PATH):
+    config = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            config = json.load(f)
+    config[model] = best_params
+    with open(path, 'w') as f:
+        json.dump(config, f, indent=2, sort_keys=True)
+
+
+"""Parse the command line arguments of the search"""
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description='Search the hyperparameters of an ml_pipelines model.')
+    parser.add_argument('train_filepath', nargs='?', default='train.csv', help='path to train.csv')
+    parser.add_argument('--target', default='LogSalePrice', help='the response variable')
+    parser.add_argument('--model', choices=sorted(SEARCH_SPACES), default='xgbr',
+                        help='the model to tune, only models whose factory loads the best parameters')
+    parser.add_argument('--method', choices=METHODS, default='halving', help='successive halving or random search')
+    parser.add_argument('--n-candidates', type=int, default=27, help='number of candidates to draw')
+    parser.add_argument('--n-jobs', type=int, default=None, help='number of processes, every core by default')
+    parser.add_argument('--results', default='search_results.jsonl',
+                        help='file to keep the results in, an interrupted search resumes from it')
+    parser.add_argument('--config', default=pl.BEST_PARAMS_PATH, help='JSON file to write the best parameters to')
+    parser.add_argument('--seed', type=int, default=0, help='seed for drawing the candidates')
+    return parser.parse_args(args)
+
+
+def main():
+    args = parse_args()
+    df_train = pd.read_csv(args.train_filepath, dtype=DTYPES)
+    start = time.perf_counter()
+    results, best_params = search(df_train, df_train[args.target], NUM_FEATS_TO_KEEP, CAT_FEATS_TO_ENCODE,
+                                  model=args.model, n_candidates=args.n_candidates, method=args.method,
+                                  n_jobs=args.n_jobs, results_path=args.results, random_state=args.seed)
+    with pd.option_context('display.width', 200, 'display.max_colwidth', 120):
+        print(results.groupby('round').head(5).to_string(index=False, float_format='{:.4f}'.format))
+    write_best_params(args.model, best_params, args.config)
+    print('\nSearched in {:.1f}s, best parameters saved to {}:\n{}'
+          .format(time.perf_counter() - start, args.config, best_params))
+
+
+if __name__ == '__main__':
+    main()